@@ -5,18 +5,26 @@ from dataclasses import dataclass, field
 from typing import Any
 
 from app import config
+from app.alerting.rolling import RollingStats
+from app.alerting.rules import RuleSet, Thresholds
+from app.collectors.inventory import ContainerInfo
 
 
 @dataclass
 class AnomalyDetector:
     """Stateful anomaly detection across collection cycles."""
 
-    # Container CPU consecutive high counts: {container_name: count}
-    _cpu_counts: dict[str, int] = field(default_factory=dict)
+    # Per-container rolling baselines (CPU/RX EWMA, memory trend, CPU streak)
+    _stats: RollingStats = field(default_factory=lambda: RollingStats(
+        config.DETECT_WINDOW, config.DETECT_EWMA_ALPHA, config.DETECT_EVICT_CYCLES))
     # Previous restart counts: {container_name: count}
     _prev_restarts: dict[str, int] = field(default_factory=dict)
-    # Previous network RX: {container_name: bytes}
-    _prev_net_rx: dict[str, int] = field(default_factory=dict)
+    # Container ids stopped via kill, so their exit is not an anomaly
+    _killed: set[str] = field(default_factory=set)
+    # Per-container threshold overrides (settings.json "rules")
+    rules: RuleSet = field(default_factory=RuleSet)
+    # Resolved thresholds of the containers seen last cycle: {(container_id, name): Thresholds}
+    _thresholds: dict[tuple[str, str], Thresholds] = field(default_factory=dict)
     # Active anomalies for dashboard display
     active_anomalies: list[dict[str, Any]] = field(default_factory=list)
 
@@ -24,58 +32,76 @@ class AnomalyDetector:
         self,
         containers: list[dict[str, Any]],
         host: dict[str, Any],
+        labels: dict[str, dict[str, str]] | None = None,
     ) -> list[dict[str, Any]]:
-        """Run all detection rules; return list of new alerts."""
+        """Run all detection rules; return list of new alerts.
+
+        ``labels`` maps container names to their Docker labels, for rules
+        matching on compose project or label.
+        """
         alerts: list[dict[str, Any]] = []
         now = time.time()
         self.active_anomalies = []
 
-        for c in containers:
-            name = c["name"]
+        names = [c["name"] for c in containers]
+        th = self._resolve(containers, labels or {})
+        # (in high-frequency mode cpu_pct is the mean of the cycle's samples,
+        # mem_pct_max the peak)
+        cpu = [c["cpu_pct"] for c in containers]
+        mem_pct = [c.get("mem_pct_max", c["mem_pct"]) for c in containers]
+        # (net_rx_rate is None on a container's first sample)
+        rx = [c.get("net_rx_rate") for c in containers]
+        st = self._stats.update(
+            names, cpu, [v > t.cpu for v, t in zip(cpu, th)],
+            [c["mem_usage"] for c in containers], rx,
+        )
+        warm = [n > config.DETECT_WARMUP for n in st["samples"]]
+
+        for i, c in enumerate(containers):
+            name = names[i]
+            t = th[i]
+
+            # Restarts are alerted from Docker events (see container_event);
+            # the snapshot only seeds the baseline count
+            self._prev_restarts.setdefault(name, c.get("restart_count", 0))
+
+            if t.mute:
+                continue
 
             # --- Container CPU ---
-            if c["cpu_pct"] > config.CPU_THRESHOLD:
-                self._cpu_counts[name] = self._cpu_counts.get(name, 0) + 1
-            else:
-                self._cpu_counts[name] = 0
-
-            if self._cpu_counts.get(name, 0) >= config.CPU_CONSECUTIVE:
-                a = {"type": "cpu_high", "target": name,
-                     "value": c["cpu_pct"], "ts": now,
-                     "msg": f"Container {name} CPU {c['cpu_pct']:.1f}% (>{config.CPU_THRESHOLD}% x{config.CPU_CONSECUTIVE})"}
-                alerts.append(a)
-                self.active_anomalies.append(a)
+            if st["streak"][i] >= t.cpu_consecutive:
+                alerts.append({"type": "cpu_high", "target": name,
+                               "value": cpu[i], "ts": now,
+                               "msg": f"Container {name} CPU {cpu[i]:.1f}% (>{t.cpu}% x{t.cpu_consecutive})"})
+            elif warm[i] and st["cpu_z"][i] > config.CPU_ZSCORE and cpu[i] > config.CPU_ZSCORE_MIN:
+                alerts.append({"type": "cpu_anomaly", "target": name,
+                               "value": cpu[i], "ts": now,
+                               "msg": f"Container {name} CPU {cpu[i]:.1f}% is {st['cpu_z'][i]:.1f}σ above its baseline"})
 
             # --- Container Memory ---
-            if c["mem_pct"] > config.MEM_THRESHOLD:
-                a = {"type": "mem_high", "target": name,
-                     "value": c["mem_pct"], "ts": now,
-                     "msg": f"Container {name} Memory {c['mem_pct']:.1f}% (>{config.MEM_THRESHOLD}%)"}
-                alerts.append(a)
-                self.active_anomalies.append(a)
-
-            # --- Restart count ---
-            prev = self._prev_restarts.get(name)
-            cur = c.get("restart_count", 0)
-            if prev is not None and cur > prev:
-                a = {"type": "restart", "target": name,
-                     "value": cur, "ts": now,
-                     "msg": f"Container {name} restarted (count {prev} -> {cur})"}
-                alerts.append(a)
-                self.active_anomalies.append(a)
-            self._prev_restarts[name] = cur
-
-            # --- Network spike ---
-            prev_rx = self._prev_net_rx.get(name)
-            cur_rx = c.get("net_rx", 0)
-            if prev_rx is not None and prev_rx > 0:
-                if cur_rx > prev_rx * config.NET_SPIKE_MULTIPLIER and cur_rx > config.NET_SPIKE_MIN_BYTES:
-                    a = {"type": "net_spike", "target": name,
-                         "value": cur_rx, "ts": now,
-                         "msg": f"Container {name} Network RX spike: {_fmt_bytes(prev_rx)} -> {_fmt_bytes(cur_rx)}"}
-                    alerts.append(a)
-                    self.active_anomalies.append(a)
-            self._prev_net_rx[name] = cur_rx
+            if mem_pct[i] > t.mem:
+                alerts.append({"type": "mem_high", "target": name,
+                               "value": mem_pct[i], "ts": now,
+                               "msg": f"Container {name} Memory {mem_pct[i]:.1f}% (>{t.mem}%)"})
+            elif st["mem_slope"][i] > 0 and st["mem_r"][i] >= config.MEM_LEAK_MIN_R and c["mem_limit"] > 0:
+                # Steady growth that reaches the limit within the horizon
+                per_sec = st["mem_slope"][i] / config.COLLECT_INTERVAL
+                eta = (c["mem_limit"] - c["mem_usage"]) / per_sec
+                if eta < config.MEM_LEAK_HORIZON:
+                    alerts.append({"type": "mem_leak", "target": name,
+                                   "value": c["mem_usage"], "ts": now,
+                                   "msg": f"Container {name} memory growing {_fmt_bytes(per_sec * 60)}/min, "
+                                          f"limit reached in ~{eta / 60:.0f} min"})
+
+            # --- Network spike (against the RX rate baseline) ---
+            base = st["rx_base"][i]
+            if warm[i] and rx[i] is not None and base > 0:
+                if rx[i] > base * config.NET_SPIKE_MULTIPLIER and rx[i] > t.net_spike_rate:
+                    alerts.append({"type": "net_spike", "target": name,
+                                   "value": rx[i], "ts": now,
+                                   "msg": f"Container {name} Network RX spike: {_fmt_bytes(base)}/s -> {_fmt_bytes(rx[i])}/s"})
+
+        self.active_anomalies.extend(alerts)
 
         # --- Host CPU Temperature ---
         cpu_temp = host.get("cpu_temp")
@@ -97,8 +123,108 @@ class AnomalyDetector:
 
         return alerts
 
+    def export_state(self) -> dict[str, Any]:
+        """Cross-cycle state worth keeping over a restart."""
+        return {
+            "prev_restarts": dict(self._prev_restarts),
+            "killed": sorted(self._killed),
+            "stats": self._stats.export(),
+        }
+
+    def restore_state(self, state: dict[str, Any], baselines: bool = True) -> None:
+        """Load ``export_state`` output; ``baselines=False`` keeps only restart
+        counts and kills, for checkpoints too old to continue streaks from."""
+        for name, count in state.get("prev_restarts", {}).items():
+            self._prev_restarts.setdefault(name, count)
+        self._killed.update(state.get("killed", ()))
+        if baselines and "stats" in state:
+            self._stats.restore(state["stats"])
+
+    def prune(self, known: list[ContainerInfo]) -> None:
+        """Forget restart counts and kill marks of containers Docker no longer has.
+
+        ``destroy`` events alone miss containers removed across event stream
+        reconnects or while the monitor was down.
+        """
+        names = {info.name for info in known}
+        for name in self._prev_restarts.keys() - names:
+            del self._prev_restarts[name]
+        self._killed &= {info.id for info in known}
+
+    def set_rules(self, rules: RuleSet) -> None:
+        self.rules = rules
+        self._thresholds = {}
+
+    def _resolve(
+        self,
+        containers: list[dict[str, Any]],
+        labels: dict[str, dict[str, str]],
+    ) -> list[Thresholds]:
+        """Thresholds per container; rule matching only runs for new containers."""
+        prev, cache = self._thresholds, {}
+        out = []
+        for c in containers:
+            # The name is part of the key: a rename must re-match name rules
+            key = (c["id"], c["name"])
+            t = prev.get(key)
+            if t is None:
+                t = self.rules.resolve(c["name"], c.get("image", ""), labels.get(c["name"], {}))
+            cache[key] = t
+            out.append(t)
+        self._thresholds = cache
+        return out
+
+    def container_event(
+        self,
+        action: str,
+        info: ContainerInfo,
+        attrs: dict[str, str],
+    ) -> list[dict[str, Any]]:
+        """Evaluate a Docker lifecycle event; return list of new alerts."""
+        alerts: list[dict[str, Any]] = []
+        now = time.time()
+        name = info.name
+
+        if action == "kill":
+            self._killed.add(info.id)
+        elif action in ("start", "restart"):
+            if action == "start":
+                self._killed.discard(info.id)
+            # Only an increased restart_count alerts: a manual `docker restart`
+            # leaves it unchanged, and the start before a restart event has
+            # already recorded the new count
+            prev = self._prev_restarts.get(name)
+            cur = info.restart_count
+            if prev is not None and cur > prev:
+                alerts.append({"type": "restart", "target": name,
+                               "value": cur, "ts": now,
+                               "msg": f"Container {name} restarted (count {prev} -> {cur})"})
+            self._prev_restarts[name] = cur
+        elif action == "die":
+            code = attrs.get("exitCode", "0")
+            # Deliberate stops go through kill; a restart policy will bring the
+            # container back and alert on the following start instead
+            if code != "0" and info.id not in self._killed and info.restart_policy in ("", "no"):
+                alerts.append({"type": "exit", "target": name,
+                               "value": int(code) if code.isdigit() else None, "ts": now,
+                               "msg": f"Container {name} exited with code {code}"})
+            self._killed.discard(info.id)
+        elif action == "rename":
+            old = attrs.get("oldName", "").lstrip("/")
+            if old in self._prev_restarts:
+                self._prev_restarts[name] = self._prev_restarts.pop(old)
+            self._stats.rename(old, name)
+        elif action == "destroy":
+            self._prev_restarts.pop(name, None)
+            self._stats.evict(name)
+
+        if alerts and self.rules.resolve(name, info.image, info.labels).mute:
+            alerts = []
+        self.active_anomalies.extend(alerts)
+        return alerts
+
 
-def _fmt_bytes(b: int) -> str:
+def _fmt_bytes(b: float) -> str:
     for unit in ("B", "KB", "MB", "GB", "TB"):
         if b < 1024:
             return f"{b:.1f}{unit}"
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Sequence
+
+
+class RollingStats:
+    """Per-container rolling statistics kept in flat, slot-indexed arrays.
+
+    Every container owns one slot across all columns: EWMA mean/variance of
+    CPU% and network RX rate, a consecutive-high counter, and a ring of its
+    last ``window`` memory readings for the leak slope. ``update`` takes one
+    cycle for all containers as parallel columns and returns per-container
+    results column-wise. Slots of containers missing for ``evict_after``
+    cycles are recycled, so memory is bounded by the live container count.
+    """
+
+    def __init__(self, window: int, alpha: float, evict_after: int) -> None:
+        self.window = window
+        self.alpha = alpha
+        self.evict_after = evict_after
+        self._slots: dict[str, int] = {}
+        self._free: list[int] = []
+        self.n = array("L")
+        self.misses = array("L")
+        self.streak = array("L")
+        self.cpu_mean = array("d")
+        self.cpu_var = array("d")
+        self.rx_mean = array("d")
+        self.rx_n = array("L")
+        # Memory rings, ``window`` values per slot, written at n % window
+        self.mem = array("d")
+        # Least-squares constants for x = 0..window-1
+        self._x_mean = (window - 1) / 2
+        self._x_var = sum((x - self._x_mean) ** 2 for x in range(window))
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot(self, name: str) -> int:
+        slot = self._slots.get(name)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                self.n[slot] = self.misses[slot] = self.streak[slot] = self.rx_n[slot] = 0
+                self.cpu_mean[slot] = self.cpu_var[slot] = self.rx_mean[slot] = 0.0
+            else:
+                slot = len(self.n)
+                for col in (self.n, self.misses, self.streak, self.rx_n):
+                    col.append(0)
+                for col in (self.cpu_mean, self.cpu_var, self.rx_mean):
+                    col.append(0.0)
+                self.mem.extend(array("d", [0.0]) * self.window)
+            self._slots[name] = slot
+        return slot
+
+    def evict(self, name: str) -> None:
+        slot = self._slots.pop(name, None)
+        if slot is not None:
+            self._free.append(slot)
+
+    def rename(self, old: str, new: str) -> None:
+        slot = self._slots.pop(old, None)
+        if slot is not None:
+            self._slots[new] = slot
+
+    def export(self) -> dict[str, list]:
+        """Per-container state as plain lists, for checkpointing."""
+        w = self.window
+        names = list(self._slots)
+        slots = [self._slots[n] for n in names]
+        out: dict[str, list] = {"names": names}
+        for col in ("n", "streak", "cpu_mean", "cpu_var", "rx_mean", "rx_n"):
+            values = getattr(self, col)
+            out[col] = [values[s] for s in slots]
+        out["mem"] = [self.mem[s * w:(s + 1) * w].tolist() for s in slots]
+        return out
+
+    def restore(self, state: dict[str, list]) -> None:
+        """Load state from ``export``; containers already tracked are kept."""
+        w = self.window
+        for i, name in enumerate(state["names"]):
+            if name in self._slots or len(state["mem"][i]) != w:
+                continue
+            s = self._slot(name)
+            for col in ("n", "streak", "cpu_mean", "cpu_var", "rx_mean", "rx_n"):
+                getattr(self, col)[s] = state[col][i]
+            self.mem[s * w:(s + 1) * w] = array("d", state["mem"][i])
+
+    def update(
+        self,
+        names: Sequence[str],
+        cpu: Sequence[float],
+        cpu_over: Sequence[bool],
+        mem: Sequence[float],
+        rx: Sequence[float | None],
+    ) -> dict[str, array]:
+        """Fold one cycle into the baselines.
+
+        Returns, aligned with ``names``: ``samples`` (count including this
+        one), ``streak`` (consecutive cycles with ``cpu_over`` set),
+        ``cpu_z`` (z-score against the baseline before this sample),
+        ``rx_base`` (RX rate baseline before this sample, NaN until known),
+        and ``mem_slope``/``mem_r`` (least-squares memory growth per cycle
+        and its correlation, NaN until the window is full).
+        """
+        slots = array("L", map(self._slot, names))
+        present = set(slots)
+        for name, slot in list(self._slots.items()):
+            if slot in present:
+                self.misses[slot] = 0
+            else:
+                self.misses[slot] += 1
+                if self.misses[slot] >= self.evict_after:
+                    self.evict(name)
+
+        a = self.alpha
+        count = len(slots)
+        samples = array("L", bytes(count * slots.itemsize))
+        streak = array("L", bytes(count * slots.itemsize))
+        cpu_z = array("d", [math.nan]) * count
+        rx_base = array("d", [math.nan]) * count
+        for i, s in enumerate(slots):
+            n = self.n[s] = self.n[s] + 1
+            samples[i] = n
+            streak[i] = self.streak[s] = self.streak[s] + 1 if cpu_over[i] else 0
+
+            # EWMA mean/variance (West); z uses the baseline before this sample
+            x = cpu[i]
+            mean, var = self.cpu_mean[s], self.cpu_var[s]
+            if n == 1:
+                self.cpu_mean[s] = x
+            else:
+                if var > 0:
+                    cpu_z[i] = (x - mean) / math.sqrt(var)
+                diff = x - mean
+                self.cpu_mean[s] = mean + a * diff
+                self.cpu_var[s] = (1 - a) * (var + a * diff * diff)
+
+            r = rx[i]
+            if r is not None:
+                if self.rx_n[s]:
+                    rx_base[i] = self.rx_mean[s]
+                    self.rx_mean[s] += a * (r - self.rx_mean[s])
+                else:
+                    self.rx_mean[s] = r
+                self.rx_n[s] += 1
+
+            self.mem[s * self.window + (n - 1) % self.window] = mem[i]
+
+        slope, corr = self._mem_trend(slots)
+        return {"samples": samples, "streak": streak, "cpu_z": cpu_z,
+                "rx_base": rx_base, "mem_slope": slope, "mem_r": corr}
+
+    def _mem_trend(self, slots: array) -> tuple[array, array]:
+        w = self.window
+        slope = array("d", [math.nan]) * len(slots)
+        corr = array("d", [math.nan]) * len(slots)
+        for i, s in enumerate(slots):
+            n = self.n[s]
+            if n < w:
+                continue
+            ring = self.mem[s * w:(s + 1) * w]
+            # Oldest reading sits at the next write position
+            start = n % w
+            ys = ring[start:] + ring[:start]
+            y_mean = sum(ys) / w
+            cov = y_var = 0.0
+            for x, y in enumerate(ys):
+                dy = y - y_mean
+                cov += (x - self._x_mean) * dy
+                y_var += dy * dy
+            slope[i] = cov / self._x_var
+            corr[i] = cov / math.sqrt(self._x_var * y_var) if y_var > 0 else 0.0
+        return slope, corr
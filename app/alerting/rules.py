@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import fnmatch
+from dataclasses import dataclass, replace
+from typing import Any
+
+from app import config
+
+# Docker Compose stamps every container with its project name
+PROJECT_LABEL = "com.docker.compose.project"
+
+# Conditions a rule can match on; all given conditions must hold
+MATCH_KEYS = ("name", "image", "project", "label")
+
+# Overridable thresholds and their types
+THRESHOLD_KEYS: dict[str, type] = {
+    "cpu": float,
+    "cpu_consecutive": int,
+    "mem": float,
+    "net_spike_rate": float,
+    "mute": bool,
+}
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    """Alert thresholds in effect for one container."""
+
+    cpu: float
+    cpu_consecutive: int
+    mem: float
+    net_spike_rate: float
+    # Suppress every container alert for matching containers
+    mute: bool = False
+
+
+def default_thresholds() -> Thresholds:
+    return Thresholds(
+        cpu=config.CPU_THRESHOLD,
+        cpu_consecutive=config.CPU_CONSECUTIVE,
+        mem=config.MEM_THRESHOLD,
+        net_spike_rate=config.NET_SPIKE_MIN_RATE,
+    )
+
+
+class RuleSet:
+    """Per-container threshold overrides, compiled once for fast lookup.
+
+    Each rule is ``{"match": {...}, <threshold>: value, ...}`` where match
+    takes a container ``name``, ``image``, compose ``project`` or
+    ``label`` ("key=value"); values may be globs. Later rules override
+    earlier ones. Rules with an exact condition are indexed by it, so
+    resolving a container only tests the rules that can apply.
+
+    Raises ValueError for malformed rules.
+    """
+
+    def __init__(self, rules: list[dict[str, Any]] | None = None) -> None:
+        self.rules = [_validate(i, r) for i, r in enumerate(rules or [])]
+        self._defaults = default_thresholds()
+        # {(key, exact value): [rule index, ...]}
+        self._index: dict[tuple[str, str], list[int]] = {}
+        # Rules without an exact condition, tested against every container
+        self._scan: list[int] = []
+        for i, rule in enumerate(self.rules):
+            exact = [(k, v) for k, v in rule["match"].items() if not _is_glob(v)]
+            if exact:
+                self._index.setdefault(exact[0], []).append(i)
+            else:
+                self._scan.append(i)
+
+    def resolve(self, name: str, image: str, labels: dict[str, str]) -> Thresholds:
+        if not self.rules:
+            return self._defaults
+        fields = {"name": name, "image": image, "project": labels.get(PROJECT_LABEL, "")}
+        keys = [(k, v) for k, v in fields.items()]
+        keys += [("label", f"{k}={v}") for k, v in labels.items()]
+        candidates = set(self._scan)
+        for key in keys:
+            candidates.update(self._index.get(key, ()))
+        out = self._defaults
+        for i in sorted(candidates):
+            rule = self.rules[i]
+            if all(_match(k, pattern, fields, labels) for k, pattern in rule["match"].items()):
+                out = replace(out, **rule["set"])
+        return out
+
+
+def _is_glob(pattern: str) -> bool:
+    return any(ch in pattern for ch in "*?[")
+
+
+def _match(key: str, pattern: str, fields: dict[str, str], labels: dict[str, str]) -> bool:
+    if key == "label":
+        return any(fnmatch.fnmatchcase(f"{k}={v}", pattern) for k, v in labels.items())
+    return fnmatch.fnmatchcase(fields[key], pattern)
+
+
+def _validate(i: int, rule: Any) -> dict[str, Any]:
+    if not isinstance(rule, dict):
+        raise ValueError(f"rule {i}: must be an object")
+    match = rule.get("match")
+    if not isinstance(match, dict) or not match:
+        raise ValueError(f"rule {i}: 'match' must be a non-empty object")
+    for k, v in match.items():
+        if k not in MATCH_KEYS:
+            raise ValueError(f"rule {i}: unknown match key {k!r} (use {', '.join(MATCH_KEYS)})")
+        if not isinstance(v, str) or not v:
+            raise ValueError(f"rule {i}: match {k!r} must be a non-empty string")
+    values = {}
+    for k, v in rule.items():
+        if k == "match":
+            continue
+        kind = THRESHOLD_KEYS.get(k)
+        if kind is None:
+            raise ValueError(f"rule {i}: unknown setting {k!r} (use {', '.join(THRESHOLD_KEYS)})")
+        if kind is bool:
+            if not isinstance(v, bool):
+                raise ValueError(f"rule {i}: {k!r} must be true or false")
+        elif isinstance(v, bool) or not isinstance(v, (int, float)) or v < 0:
+            raise ValueError(f"rule {i}: {k!r} must be a non-negative number")
+        elif k == "cpu_consecutive" and (v != int(v) or v < 1):
+            # 0 would make every matched container's streak count as a breach
+            raise ValueError(f"rule {i}: {k!r} must be a whole number of at least 1")
+        values[k] = kind(v)
+    return {"match": dict(match), "set": values}
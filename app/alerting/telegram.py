@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import random
 import time
 from typing import Any
 
@@ -10,38 +12,165 @@ from app import config
 
 logger = logging.getLogger(__name__)
 
-# {alert_key: last_sent_timestamp}
-_cooldowns: dict[str, float] = {}
+# Telegram rejects messages longer than this
+MAX_MESSAGE_CHARS = 4096
+# Retry backoff: BACKOFF_BASE * 2**attempt seconds, capped, plus jitter
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
 
 
-async def send_alert(alert: dict[str, Any]) -> bool:
-    """Send a Telegram alert with cooldown."""
-    if not config.TELEGRAM_BOT_TOKEN or not config.TELEGRAM_CHAT_ID:
-        return False
+class AlertDispatcher:
+    """Background Telegram sender so alerting never blocks collection.
+
+    Alerts passed to ``enqueue`` together (one collection cycle, one event)
+    are coalesced into a single digest message. A worker task delivers the
+    queued digests over one pooled HTTP client, retrying with exponential
+    backoff and honoring Telegram's 429 ``retry_after``. The queue is
+    bounded: when it is full, new digests are dropped and counted.
+    """
+
+    def __init__(self, maxsize: int = config.ALERT_QUEUE_SIZE,
+                 api_url: str = config.TELEGRAM_API_URL) -> None:
+        self._queue: asyncio.Queue[list[dict[str, Any]]] = asyncio.Queue(maxsize)
+        self._api_url = api_url.rstrip("/")
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        # {alert_key: last_sent_timestamp}
+        self.cooldowns: dict[str, float] = {}
+        self._stats = {"sent": 0, "dropped": 0, "failed": 0, "retries": 0, "suppressed": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(config.TELEGRAM_BOT_TOKEN and config.TELEGRAM_CHAT_ID)
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        self._client = httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_connections=2))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict[str, Any]:
+        return {"queued": self._queue.qsize(), "capacity": self._queue.maxsize, **self._stats}
+
+    def enqueue(self, alerts: list[dict[str, Any]]) -> None:
+        """Queue alerts not in cooldown as one digest; never blocks."""
+        if not alerts or self._task is None:
+            return
+        now = time.time()
+        due = []
+        for alert in alerts:
+            key = _key(alert)
+            if now - self.cooldowns.get(key, 0) < config.ALERT_COOLDOWN_MINUTES * 60:
+                self._stats["suppressed"] += 1
+                continue
+            # Claimed now so the next cycle doesn't queue it again; released
+            # if delivery ultimately fails
+            self.cooldowns[key] = now
+            due.append(alert)
+        if not due:
+            return
+        try:
+            self._queue.put_nowait(due)
+        except asyncio.QueueFull:
+            self._stats["dropped"] += 1
+            self._release(due, now)
+            logger.warning("Alert queue full, dropped digest of %d alerts", len(due))
+
+    async def _run(self) -> None:
+        while True:
+            digest = await self._queue.get()
+            claimed = time.time()
+            try:
+                ok = True
+                for text in _format(digest):
+                    ok = await self._send(text) and ok
+                if ok:
+                    logger.info("Telegram alert sent: %s", ", ".join(_key(a) for a in digest))
+                else:
+                    self._release(digest, claimed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Alert dispatch failed")
 
-    key = f"{alert['type']}:{alert['target']}"
-    now = time.time()
-    last = _cooldowns.get(key, 0)
-    if now - last < config.ALERT_COOLDOWN_MINUTES * 60:
+    async def _send(self, text: str) -> bool:
+        url = f"{self._api_url}/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
+        payload = {
+            "chat_id": config.TELEGRAM_CHAT_ID,
+            "text": text,
+            "parse_mode": "Markdown",
+        }
+        for attempt in range(config.ALERT_MAX_RETRIES + 1):
+            if attempt:
+                self._stats["retries"] += 1
+            try:
+                resp = await self._client.post(url, json=payload)
+            except httpx.HTTPError as e:
+                logger.warning("Telegram send failed: %s", e)
+                delay = _backoff(attempt)
+            else:
+                if resp.status_code == 200:
+                    self._stats["sent"] += 1
+                    return True
+                if resp.status_code == 429:
+                    delay = _retry_after(resp) or _backoff(attempt)
+                elif resp.status_code >= 500:
+                    delay = _backoff(attempt)
+                else:
+                    # Bad token, chat or message: retrying won't help
+                    logger.warning("Telegram API error %s: %s", resp.status_code, resp.text)
+                    break
+                logger.warning("Telegram API %s, retrying in %.1fs", resp.status_code, delay)
+            if attempt < config.ALERT_MAX_RETRIES:
+                await asyncio.sleep(delay)
+        self._stats["failed"] += 1
         return False
 
-    text = f"🚨 *Docker Monitor Alert*\n\n{alert['msg']}"
-    url = f"https://api.telegram.org/bot{config.TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        "chat_id": config.TELEGRAM_CHAT_ID,
-        "text": text,
-        "parse_mode": "Markdown",
-    }
+    def _release(self, alerts: list[dict[str, Any]], claimed: float) -> None:
+        for alert in alerts:
+            key = _key(alert)
+            if self.cooldowns.get(key, 0) <= claimed:
+                self.cooldowns.pop(key, None)
+
+
+def _key(alert: dict[str, Any]) -> str:
+    return f"{alert['type']}:{alert['target']}"
+
+
+def _format(alerts: list[dict[str, Any]]) -> list[str]:
+    """Digest text, split into as many messages as Telegram's size limit needs."""
+    if len(alerts) == 1:
+        return [f"🚨 *Docker Monitor Alert*\n\n{alerts[0]['msg']}"[:MAX_MESSAGE_CHARS]]
+    header = f"🚨 *Docker Monitor Alerts ({len(alerts)})*\n"
+    messages, text = [], header
+    for alert in alerts:
+        line = f"\n• {alert['msg']}"
+        if len(text) + len(line) > MAX_MESSAGE_CHARS and text != header:
+            messages.append(text)
+            text = header
+        text += line
+    messages.append(text[:MAX_MESSAGE_CHARS])
+    return messages
 
+
+def _backoff(attempt: int) -> float:
+    return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(1.0, 1.25)
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.post(url, json=payload)
-            if resp.status_code == 200:
-                _cooldowns[key] = now
-                logger.info("Telegram alert sent: %s", key)
-                return True
-            else:
-                logger.warning("Telegram API error %s: %s", resp.status_code, resp.text)
-    except httpx.HTTPError as e:
-        logger.warning("Telegram send failed: %s", e)
-    return False
+        return float(resp.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return None
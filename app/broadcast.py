@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+
+# Frames buffered per subscriber before the oldest is dropped
+SUBSCRIBER_QUEUE_SIZE = 8
+
+
+class Broadcaster:
+    """Fan-out of Server-Sent Events frames to all connected dashboards.
+
+    Each payload is JSON-encoded once per publish and the same bytes are
+    handed to every subscriber, so the cost of a cycle does not grow with the
+    number of viewers. Slow subscribers lose their oldest frames instead of
+    holding back the others.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: set[asyncio.Queue[bytes]] = set()
+        # Last frame of each retained event, replayed to new subscribers
+        self._retained: dict[str, bytes] = {}
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue[bytes]:
+        q: asyncio.Queue[bytes] = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        for frame in self._retained.values():
+            q.put_nowait(frame)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue[bytes]) -> None:
+        self._subscribers.discard(q)
+
+    def publish(self, event: str, data: Any, retain: bool = False) -> None:
+        """Send ``data`` to all subscribers; ``bytes`` are taken as encoded JSON."""
+        if not isinstance(data, bytes):
+            data = json.dumps(data, separators=(",", ":")).encode()
+        frame = b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+        if retain:
+            self._retained[event] = frame
+        for q in self._subscribers:
+            if q.full():
+                q.get_nowait()
+            q.put_nowait(frame)
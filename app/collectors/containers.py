@@ -1,19 +1,27 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import os
 import time
 from typing import Any
 
 import aiodocker
+import aiohttp
+from aiodocker.jsonstream import json_stream_stream
 
+from app.collectors.inventory import ContainerInfo
+from app.instrumentation import count_docker_call
 
-async def collect_container_stats() -> list[dict[str, Any]]:
-    """Collect stats for all running containers via Docker API."""
+logger = logging.getLogger(__name__)
+
+
+async def collect_container_stats(running: list[ContainerInfo]) -> list[dict[str, Any]]:
+    """Collect one-shot stats for the given running containers via Docker API."""
     results: list[dict[str, Any]] = []
     docker = aiodocker.Docker()
     try:
-        containers = await docker.containers.list()
-        tasks = [_get_one_stat(c) for c in containers]
+        tasks = [_get_one_stat(docker, info) for info in running]
         stats_list = await asyncio.gather(*tasks, return_exceptions=True)
         for s in stats_list:
             if isinstance(s, dict):
@@ -23,32 +31,56 @@ async def collect_container_stats() -> list[dict[str, Any]]:
     return results
 
 
-async def _get_one_stat(container: aiodocker.docker.DockerContainer) -> dict[str, Any]:
-    info = await container.show()
-    name = info["Name"].lstrip("/")
-    state = info["State"]
-    restart_count = info.get("RestartCount", 0)
-
+async def _get_one_stat(docker: aiodocker.Docker, info: ContainerInfo) -> dict[str, Any]:
     # One-shot stats (stream=False) returns a list with one entry
-    stats_result = await container.stats(stream=False)
+    count_docker_call("containers/stats")
+    stats_result = await docker.containers.container(info.id).stats(stream=False)
 
     if not stats_result:
-        return _empty_stat(name, state, restart_count)
+        return _empty_stat(info)
 
     stats = stats_result[0] if isinstance(stats_result, list) else stats_result
+    return _build_stat(info, stats)
+
 
+def _build_stat(info: ContainerInfo, stats: dict) -> dict[str, Any]:
+    """Combine cached container metadata and a raw stats sample into one record."""
     cpu_pct = _calc_cpu_percent_oneshot(stats)
     mem_usage, mem_limit, mem_pct = _calc_mem(stats)
-    net_rx, net_tx = _calc_net(stats)
-    blk_read, blk_write = _calc_blkio(stats)
+    net_rx, net_tx, net_rx_packets, net_tx_packets = _calc_net(stats)
+    blk_read, blk_write, blk_read_ops, blk_write_ops = _calc_blkio(stats)
+    return stat_record(info, cpu_pct, mem_usage, mem_limit, mem_pct,
+                       net_rx, net_tx, blk_read, blk_write,
+                       net_rx_packets, net_tx_packets, blk_read_ops, blk_write_ops)
 
+
+def stat_record(
+    info: ContainerInfo,
+    cpu_pct: float,
+    mem_usage: int,
+    mem_limit: int,
+    mem_pct: float,
+    net_rx: int,
+    net_tx: int,
+    blk_read: int,
+    blk_write: int,
+    net_rx_packets: int = 0,
+    net_tx_packets: int = 0,
+    blk_read_ops: int = 0,
+    blk_write_ops: int = 0,
+) -> dict[str, Any]:
+    """The per-container record shape shared by every collector.
+
+    Network and block I/O values are cumulative counters; the per-second
+    rates are added later by ``rates.RateTracker``.
+    """
     return {
-        "name": name,
-        "id": info["Id"][:12],
-        "image": info["Config"]["Image"],
-        "status": state.get("Status", "unknown"),
-        "started_at": state.get("StartedAt", ""),
-        "restart_count": restart_count,
+        "name": info.name,
+        "id": info.id[:12],
+        "image": info.image,
+        "status": info.status,
+        "started_at": info.started_at,
+        "restart_count": info.restart_count,
         "cpu_pct": round(cpu_pct, 2),
         "mem_usage": mem_usage,
         "mem_limit": mem_limit,
@@ -57,18 +89,112 @@ async def _get_one_stat(container: aiodocker.docker.DockerContainer) -> dict[str
         "net_tx": net_tx,
         "blk_read": blk_read,
         "blk_write": blk_write,
+        "net_rx_packets": net_rx_packets,
+        "net_tx_packets": net_tx_packets,
+        "blk_read_ops": blk_read_ops,
+        "blk_write_ops": blk_write_ops,
         "ts": time.time(),
     }
 
 
-def _empty_stat(name: str, state: dict, restart_count: int) -> dict[str, Any]:
-    return {
-        "name": name, "id": "", "image": "", "status": state.get("Status", "unknown"),
-        "started_at": "", "restart_count": restart_count,
-        "cpu_pct": 0.0, "mem_usage": 0, "mem_limit": 0, "mem_pct": 0.0,
-        "net_rx": 0, "net_tx": 0, "blk_read": 0, "blk_write": 0,
-        "ts": time.time(),
-    }
+class ContainerStatsStream:
+    """Long-lived collector keeping one Docker stats stream per running container.
+
+    Each stream delivers a sample roughly every second; only the latest one is
+    kept, so a collection cycle is an in-memory snapshot with no Docker API
+    calls, independent of the number of containers.
+    """
+
+    def __init__(self) -> None:
+        self._docker: aiodocker.Docker | None = None
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._latest: dict[str, dict[str, Any]] = {}
+
+    async def start(self) -> None:
+        self._docker = _unpooled_docker()
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        self._latest.clear()
+        if self._docker is not None:
+            await self._docker.close()
+            self._docker = None
+
+    async def sync(self, running: list[ContainerInfo]) -> None:
+        """Attach streams for new running containers, detach stopped ones."""
+        if self._docker is None:
+            await self.start()
+        wanted = {info.id: info for info in running}
+        for cid in list(self._tasks):
+            if cid not in wanted:
+                self.detach(cid)
+        for cid, info in wanted.items():
+            if cid not in self._tasks:
+                self.attach(info)
+
+    def attach(self, info: ContainerInfo) -> None:
+        task = asyncio.create_task(self._follow(info))
+        self._tasks[info.id] = task
+        task.add_done_callback(lambda _t, cid=info.id: self._forget(cid, _t))
+
+    def detach(self, cid: str) -> None:
+        task = self._tasks.pop(cid, None)
+        if task is not None:
+            task.cancel()
+        self._latest.pop(cid, None)
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Latest sample of every followed container."""
+        return [dict(s) for s in self._latest.values()]
+
+    def _forget(self, cid: str, task: asyncio.Task) -> None:
+        if self._tasks.get(cid) is task:
+            del self._tasks[cid]
+            self._latest.pop(cid, None)
+
+    async def _follow(self, info: ContainerInfo) -> None:
+        try:
+            count_docker_call("containers/stats?stream")
+            # timeout=0: the default session timeout would cut the stream after 5 min
+            async with self._docker._query(
+                f"containers/{info.id}/stats",
+                params={"stream": "1"},
+                timeout=0,
+            ) as response:
+                async for stats in json_stream_stream(response):
+                    if stats.get("read", "").startswith("0001-"):
+                        # Zero timestamp: the container has stopped
+                        break
+                    self._latest[info.id] = _build_stat(info, stats)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug("Stats stream for %s ended: %s", info.id[:12], e)
+
+
+def _empty_stat(info: ContainerInfo) -> dict[str, Any]:
+    return stat_record(info, 0.0, 0, 0, 0.0, 0, 0, 0, 0)
+
+
+def _unpooled_docker() -> aiodocker.Docker:
+    """Docker client whose connection pool has no size cap.
+
+    One connection stays checked out per stats stream, so aiohttp's default
+    cap of 100 would starve the other API calls on large hosts.
+    """
+    host = os.environ.get("DOCKER_HOST") or "unix:///var/run/docker.sock"
+    if host.startswith("unix://"):
+        # Dummy hostname for URL composition, as aiodocker itself does
+        return aiodocker.Docker(url="unix://localhost",
+                                connector=aiohttp.UnixConnector(host[len("unix://"):], limit=0))
+    if host.startswith("tcp://") and os.environ.get("DOCKER_TLS_VERIFY", "0") != "1":
+        return aiodocker.Docker(url="http://" + host[len("tcp://"):],
+                                connector=aiohttp.TCPConnector(limit=0))
+    # TLS or other transports: aiodocker sets up the connector (default cap)
+    return aiodocker.Docker()
 
 
 def _calc_cpu_percent_oneshot(stats: dict) -> float:
@@ -101,16 +227,35 @@ def _calc_mem(stats: dict) -> tuple[int, int, float]:
     return usage, limit, pct
 
 
-def _calc_net(stats: dict) -> tuple[int, int]:
-    networks = stats.get("networks", {})
-    rx = sum(v.get("rx_bytes", 0) for v in networks.values())
-    tx = sum(v.get("tx_bytes", 0) for v in networks.values())
-    return rx, tx
+def _calc_net(stats: dict) -> tuple[int, int, int, int]:
+    """Cumulative (rx_bytes, tx_bytes, rx_packets, tx_packets) over all networks."""
+    networks = (stats.get("networks") or {}).values()
+    return (
+        sum(v.get("rx_bytes", 0) for v in networks),
+        sum(v.get("tx_bytes", 0) for v in networks),
+        sum(v.get("rx_packets", 0) for v in networks),
+        sum(v.get("tx_packets", 0) for v in networks),
+    )
 
 
-def _calc_blkio(stats: dict) -> tuple[int, int]:
+def _calc_blkio(stats: dict) -> tuple[int, int, int, int]:
+    """Cumulative (read_bytes, write_bytes, read_ops, write_ops).
+
+    cgroup v1 reports ops as "Read"/"Write", v2 as "read"/"write"; on v2
+    Docker leaves io_serviced_recursive empty, so op counts stay 0 there.
+    """
     blkio = stats.get("blkio_stats", {})
-    entries = blkio.get("io_service_bytes_recursive") or []
-    read = sum(e["value"] for e in entries if e.get("op") == "read")
-    write = sum(e["value"] for e in entries if e.get("op") == "write")
+    read, write = _sum_blkio(blkio.get("io_service_bytes_recursive"))
+    read_ops, write_ops = _sum_blkio(blkio.get("io_serviced_recursive"))
+    return read, write, read_ops, write_ops
+
+
+def _sum_blkio(entries: list[dict] | None) -> tuple[int, int]:
+    read = write = 0
+    for e in entries or []:
+        op = e.get("op", "").lower()
+        if op == "read":
+            read += e["value"]
+        elif op == "write":
+            write += e["value"]
     return read, write
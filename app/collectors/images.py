@@ -4,12 +4,15 @@ from typing import Any
 
 import aiodocker
 
+from app.instrumentation import count_docker_call
+
 
 async def collect_image_stats() -> dict[str, Any]:
     """Collect Docker image and disk usage info."""
     docker = aiodocker.Docker()
     try:
         # Get system df info
+        count_docker_call("system/df")
         resp = await docker._query_json("system/df")
         images = resp.get("Images") or []
         total_image_size = sum(img.get("Size", 0) for img in images)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+import aiodocker
+from aiodocker.jsonstream import json_stream_stream
+
+from app.instrumentation import count_docker_call
+
+logger = logging.getLogger(__name__)
+
+# Container lifecycle events that change what the inventory knows
+WATCHED_EVENTS = ("start", "die", "kill", "restart", "rename", "destroy")
+
+EventListener = Callable[[str, "ContainerInfo", dict[str, str]], Awaitable[None]]
+
+
+@dataclass
+class ContainerInfo:
+    """Slow-changing container metadata, refreshed only on lifecycle events."""
+
+    id: str
+    name: str
+    image: str
+    status: str = "running"
+    started_at: str = ""
+    restart_count: int = 0
+    restart_policy: str = ""
+    network_mode: str = ""
+    pid: int = 0
+    labels: dict[str, str] = field(default_factory=dict)
+
+
+def _info_from_inspect(data: dict[str, Any]) -> ContainerInfo:
+    state = data.get("State", {})
+    host_config = data.get("HostConfig") or {}
+    cfg = data.get("Config") or {}
+    return ContainerInfo(
+        id=data["Id"],
+        name=data["Name"].lstrip("/"),
+        image=cfg.get("Image", ""),
+        status=state.get("Status", "unknown"),
+        started_at=state.get("StartedAt", ""),
+        restart_count=data.get("RestartCount", 0),
+        restart_policy=(host_config.get("RestartPolicy") or {}).get("Name", ""),
+        network_mode=host_config.get("NetworkMode", ""),
+        pid=state.get("Pid", 0),
+        labels=cfg.get("Labels") or {},
+    )
+
+
+class ContainerInventory:
+    """Container metadata cache seeded once and kept current via ``/events``.
+
+    Replaces the per-cycle ``container.show()`` calls: collectors read names,
+    images and restart counts from here, and listeners are notified of
+    lifecycle events as they happen.
+    """
+
+    def __init__(self) -> None:
+        self._docker: aiodocker.Docker | None = None
+        self._containers: dict[str, ContainerInfo] = {}
+        self._listeners: list[EventListener] = []
+        self._task: asyncio.Task | None = None
+        # False until the first seed, while the cache is still empty
+        self.seeded = False
+
+    def add_listener(self, listener: EventListener) -> None:
+        self._listeners.append(listener)
+
+    def running(self) -> list[ContainerInfo]:
+        return [c for c in self._containers.values() if c.status == "running"]
+
+    def containers(self) -> list[ContainerInfo]:
+        """Every known container, running or not."""
+        return list(self._containers.values())
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._docker is not None:
+            await self._docker.close()
+            self._docker = None
+
+    async def _run(self) -> None:
+        """Follow the event stream, re-seeding after every reconnect."""
+        backoff = 1.0
+        while True:
+            try:
+                if self._docker is None:
+                    self._docker = aiodocker.Docker()
+                await self._follow_events()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Docker event stream failed: %s", e)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _follow_events(self) -> None:
+        filters = json.dumps({"type": ["container"], "event": list(WATCHED_EVENTS)})
+        count_docker_call("events")
+        # timeout=0: the events stream must outlive the default session timeout
+        async with self._docker._query(
+            "events", params={"filters": filters}, timeout=0,
+        ) as response:
+            # Subscribe before seeding so no event falls between the two
+            await self._seed()
+            async for event in json_stream_stream(response):
+                try:
+                    await self._apply(event)
+                except Exception:
+                    logger.exception("Failed to apply Docker event %s", event.get("Action"))
+
+    async def _seed(self) -> None:
+        count_docker_call("containers/json")
+        containers = await self._docker.containers.list()
+        infos = await asyncio.gather(
+            *(self._inspect(c.id) for c in containers), return_exceptions=True,
+        )
+        self._containers = {i.id: i for i in infos if isinstance(i, ContainerInfo)}
+        self.seeded = True
+        logger.info("Container inventory seeded with %d containers", len(self._containers))
+
+    async def _inspect(self, cid: str) -> ContainerInfo:
+        count_docker_call("containers/inspect")
+        data = await self._docker._query_json(f"containers/{cid}/json")
+        return _info_from_inspect(data)
+
+    async def _apply(self, event: dict[str, Any]) -> None:
+        action = event.get("Action", "")
+        actor = event.get("Actor") or {}
+        cid = actor.get("ID", "")
+        attrs = actor.get("Attributes") or {}
+        if not cid:
+            return
+
+        info = self._containers.get(cid)
+        if action == "start":
+            # The only show() left: a started container has a new pid,
+            # start time and possibly a bumped RestartCount
+            fresh = await self._inspect(cid)
+            if info is None:
+                info = fresh
+                self._containers[cid] = info
+            else:
+                vars(info).update(vars(fresh))
+        elif info is None:
+            return
+        elif action == "die":
+            info.status = "exited"
+            info.pid = 0
+        elif action == "rename":
+            info.name = attrs.get("name", info.name).lstrip("/")
+        elif action == "destroy":
+            del self._containers[cid]
+
+        for listener in self._listeners:
+            await listener(action, info, attrs)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from typing import Any
+
+# Cumulative counter -> per-second rate field added to each record
+RATE_FIELDS: dict[str, str] = {
+    "net_rx": "net_rx_rate",
+    "net_tx": "net_tx_rate",
+    "net_rx_packets": "net_rx_pps",
+    "net_tx_packets": "net_tx_pps",
+    "blk_read": "blk_read_rate",
+    "blk_write": "blk_write_rate",
+    "blk_read_ops": "blk_read_iops",
+    "blk_write_ops": "blk_write_iops",
+}
+
+
+class RateTracker:
+    """Per-second rates from the cumulative counters of successive samples.
+
+    State is keyed by container id, so a recreated container starts from a
+    fresh baseline. A counter that goes backwards (restart, new network
+    namespace) is treated as reset to zero, so its current value is the
+    increase since then. The first sample of a container has no rates (None).
+    """
+
+    def __init__(self) -> None:
+        # {container_id: (ts, {counter: value}, {rate_field: rate})}
+        self._prev: dict[str, tuple[float, dict[str, int], dict[str, float | None]]] = {}
+
+    def apply(self, records: list[dict[str, Any]]) -> None:
+        """Add the rate fields to ``records`` in place."""
+        seen = set()
+        for rec in records:
+            key = rec["id"] or rec["name"]
+            seen.add(key)
+            prev = self._prev.get(key)
+            if prev is not None and rec["ts"] <= prev[0]:
+                # Stalled source repeated the previous sample
+                rec.update(prev[2])
+                continue
+            counters = {c: rec.get(c) or 0 for c in RATE_FIELDS}
+            rates: dict[str, float | None] = dict.fromkeys(RATE_FIELDS.values())
+            if prev is not None:
+                dt = rec["ts"] - prev[0]
+                for counter, field in RATE_FIELDS.items():
+                    delta = counters[counter] - prev[1][counter]
+                    if delta < 0:
+                        delta = counters[counter]
+                    rates[field] = round(delta / dt, 2)
+            self._prev[key] = (rec["ts"], counters, rates)
+            rec.update(rates)
+        for key in self._prev.keys() - seen:
+            del self._prev[key]
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import math
+from array import array
+from bisect import bisect_right
+from typing import Any
+
+from app.collectors.rates import RATE_FIELDS
+
+# Per-sample columns kept in the ring buffers, with their array typecodes
+RING_FIELDS: dict[str, str] = {
+    "ts": "d",
+    "cpu_pct": "d",
+    "mem_usage": "q",
+    "mem_pct": "d",
+    "net_rx": "q",
+    "net_tx": "q",
+    "blk_read": "q",
+    "blk_write": "q",
+    **{rate: "d" for rate in RATE_FIELDS.values()},
+}
+
+
+class RingBuffer:
+    """Fixed-size, array-backed sample history for one container."""
+
+    __slots__ = ("capacity", "cols", "head", "count", "meta")
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.cols = {f: array(tc, [0]) * capacity for f, tc in RING_FIELDS.items()}
+        self.head = 0
+        self.count = 0
+        # Latest full record, for the non-numeric fields (image, status, ...)
+        self.meta: dict[str, Any] = {}
+
+    def append(self, sample: dict[str, Any]) -> bool:
+        """Store a sample; a repeat of the newest ts (stalled source) is skipped."""
+        if self.count and sample["ts"] <= self.cols["ts"][self.head - 1]:
+            return False
+        for f, col in self.cols.items():
+            col[self.head] = sample.get(f) or 0
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.meta = sample
+        return True
+
+    def window(self, since: float = 0.0) -> dict[str, array]:
+        """Samples newer than ``since`` as ``{field: array}``, oldest first."""
+        start = (self.head - self.count) % self.capacity
+        ordered = {}
+        for f, col in self.cols.items():
+            if start + self.count <= self.capacity:
+                ordered[f] = col[start:start + self.count]
+            else:
+                ordered[f] = col[start:] + col[:self.head]
+        skip = bisect_right(ordered["ts"], since)
+        if skip:
+            ordered = {f: col[skip:] for f, col in ordered.items()}
+        return ordered
+
+    def aggregate(self, since: float) -> dict[str, Any] | None:
+        """One record summarizing the samples newer than ``since``.
+
+        CPU and the I/O rates are window means, with the CPU peak in
+        ``cpu_pct_max``; memory keeps the last value plus the window peak in
+        ``mem_pct_max``; counters keep the last value.
+        """
+        w = self.window(since)
+        n = len(w["ts"])
+        if not n:
+            return None
+        rec = dict(self.meta)
+        rec["cpu_pct"] = round(sum(w["cpu_pct"]) / n, 2)
+        rec["cpu_pct_max"] = round(max(w["cpu_pct"]), 2)
+        rec["mem_pct_max"] = round(max(w["mem_pct"]), 2)
+        for rate in RATE_FIELDS.values():
+            rec[rate] = round(sum(w[rate]) / n, 2)
+        rec["samples"] = n
+        return rec
+
+
+class SampleBuffers:
+    """Ring buffers for every running container, keyed by container name."""
+
+    def __init__(self, window: float, interval: float) -> None:
+        self.capacity = math.ceil(window / interval) + 1
+        self._rings: dict[str, RingBuffer] = {}
+
+    def add(self, samples: list[dict[str, Any]]) -> None:
+        """Append one sampling pass; containers absent from it are evicted."""
+        seen = set()
+        for s in samples:
+            name = s["name"]
+            seen.add(name)
+            ring = self._rings.get(name)
+            if ring is None:
+                ring = self._rings[name] = RingBuffer(self.capacity)
+            ring.append(s)
+        for name in self._rings.keys() - seen:
+            del self._rings[name]
+
+    def series(self, name: str, seconds: float, now: float) -> dict[str, list] | None:
+        ring = self._rings.get(name)
+        if ring is None:
+            return None
+        return {f: col.tolist() for f, col in ring.window(now - seconds).items()}
+
+    def aggregate(self, since: float) -> list[dict[str, Any]]:
+        out = []
+        for ring in self._rings.values():
+            rec = ring.aggregate(since)
+            if rec is not None:
+                out.append(rec)
+        return out
@@ -1,13 +1,55 @@
 import os
+import socket
 
 TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHAT_ID: str = os.getenv("TELEGRAM_CHAT_ID", "")
+TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+# Alert digests waiting for delivery, and delivery attempts after the first
+ALERT_QUEUE_SIZE: int = 100
+ALERT_MAX_RETRIES: int = 5
 AUTH_USER: str = os.getenv("AUTH_USER", "")
 AUTH_PASS: str = os.getenv("AUTH_PASS", "")
 MAX_CONNECTIONS: int = int(os.getenv("MAX_CONNECTIONS", "3"))
 DB_PATH: str = os.getenv("DB_PATH", "/data/monitor.db")
 COLLECT_INTERVAL: int = int(os.getenv("COLLECT_INTERVAL", "10"))
-RETENTION_DAYS: int = 7
+# "stream" keeps a stats stream open per container; "oneshot" polls each cycle;
+# "cgroup" reads cgroup v2 files under /host_sys directly (falls back to stream)
+COLLECTOR_MODE: str = os.getenv("COLLECTOR_MODE", "stream")
+# High-frequency mode: sample every HF_INTERVAL seconds (0 = off) into
+# in-memory ring buffers holding the last HF_WINDOW seconds; each collection
+# cycle persists one aggregate per container. Use with stream or cgroup mode.
+HF_INTERVAL: float = float(os.getenv("HF_INTERVAL", "0"))
+HF_WINDOW: int = 300
+# Federation: an agent pushes every snapshot to AGGREGATOR_URL; an instance
+# with FEDERATION_TOKEN set accepts pushes at /api/ingest bearing that token
+HOST_NAME: str = os.getenv("HOST_NAME") or socket.gethostname()
+AGGREGATOR_URL: str = os.getenv("AGGREGATOR_URL", "")
+FEDERATION_TOKEN: str = os.getenv("FEDERATION_TOKEN", "")
+FEDERATION_MAX_BODY: int = 32 * 1024 * 1024  # decompressed snapshot bytes
+FEDERATION_STALE: int = 60  # seconds without a push before a host shows stale
+FEDERATION_EVICT: int = 86400  # ...and before its live snapshot is dropped
+# Raw samples and alerts
+RETENTION_DAYS: int = int(os.getenv("RETENTION_DAYS", "7"))
+# Write-behind storage: queued writes are committed in one batch per interval
+WRITE_QUEUE_SIZE: int = int(os.getenv("WRITE_QUEUE_SIZE", "10000"))
+WRITE_FLUSH_INTERVAL: float = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))
+# Background retention: expired rows are deleted in chunks every interval,
+# then freed pages are returned to the OS via incremental vacuum
+RETENTION_INTERVAL: int = int(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_CHUNK_ROWS: int = 5000
+RETENTION_CHUNK_PAUSE: float = 0.2
+VACUUM_PAGES: int = 2000
+# Detector state and alert cooldowns are checkpointed every STATE_CHECKPOINT
+# seconds and on shutdown; on boot, rolling baselines older than
+# STATE_MAX_AGE are discarded
+STATE_CHECKPOINT: int = 60
+STATE_MAX_AGE: int = 600
+# Worker threads (and pooled read-only connections) serving history queries
+READ_POOL_SIZE: int = int(os.getenv("READ_POOL_SIZE", "4"))
+# Downsampled rollup tiers: {resolution_seconds: retention_days}
+ROLLUP_TIERS: dict[int, int] = {60: 30, 300: 90, 3600: 400}
+# History endpoints pick the finest tier that stays within this many points
+HISTORY_MAX_POINTS: int = int(os.getenv("HISTORY_MAX_POINTS", "1000"))
 ALERT_COOLDOWN_MINUTES: int = 30
 
 # Anomaly thresholds
@@ -17,4 +59,14 @@ MEM_THRESHOLD: float = float(os.getenv("MEM_THRESHOLD", "90.0"))
 HOST_TEMP_THRESHOLD: float = 85.0
 DISK_THRESHOLD: float = 90.0
 NET_SPIKE_MULTIPLIER: float = 10.0
-NET_SPIKE_MIN_BYTES: int = 100 * 1024 * 1024  # 100MB
+NET_SPIKE_MIN_RATE: int = 10 * 1024 * 1024  # 10MB/s
+
+# Rolling baselines, per container over the last DETECT_WINDOW cycles
+DETECT_WINDOW: int = 60
+DETECT_EWMA_ALPHA: float = 0.1
+DETECT_WARMUP: int = 12  # cycles before baseline rules may fire
+DETECT_EVICT_CYCLES: int = 3  # state dropped after this many cycles unseen
+CPU_ZSCORE: float = 4.0  # CPU this many deviations above its EWMA baseline...
+CPU_ZSCORE_MIN: float = 50.0  # ...and above this %, below the CPU_THRESHOLD streak
+MEM_LEAK_MIN_R: float = 0.9  # correlation of memory growth over the window
+MEM_LEAK_HORIZON: int = 6 * 3600  # alert if the limit is reached within this
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterator
+
+from app.snapshot import GZIP_LEVEL
+
+# Export formats: {name: (media type, file extension)}
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def encode_rows(header: list[str], batches: Iterator[list[tuple]], fmt: str) -> Iterator[bytes]:
+    """Encode row batches as NDJSON (one object per row) or CSV with a header line.
+
+    One chunk is produced per batch, so the output streams at the pace
+    the rows are read.
+    """
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(header)
+        for rows in batches:
+            writer.writerows(rows)
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue().encode()
+        return
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    for rows in batches:
+        yield "".join(encode(dict(zip(header, r))) + "\n" for r in rows).encode()
+
+
+def gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Compress a chunk stream into one gzip member, incrementally."""
+    comp = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
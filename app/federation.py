@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+import re
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+from app import config
+from app.snapshot import GZIP_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the agent's host name on pushes
+HOST_HEADER = "X-Dockwatch-Host"
+
+# Agent host names: they end up in storage names, ETags and file names
+HOST_NAME_PATTERN = re.compile(r"[A-Za-z0-9._-]+")
+
+
+def remote_name(host: str, name: str) -> str:
+    """Storage name of an agent's container; Docker names never contain "/"."""
+    return f"{host}/{name}"
+
+
+class SnapshotPusher:
+    """Agent side: push each cycle's gzipped snapshot to the aggregator.
+
+    At most one push is in flight; a snapshot produced meanwhile replaces
+    any older pending one, so a slow aggregator delays nothing but its own
+    view and never queues more than one snapshot.
+    """
+
+    def __init__(self, url: str = config.AGGREGATOR_URL, token: str = config.FEDERATION_TOKEN) -> None:
+        self._url = url.rstrip("/") + "/api/ingest"
+        self._headers = {
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Authorization": f"Bearer {token}",
+            HOST_HEADER: config.HOST_NAME,
+        }
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        self._pending: bytes | None = None
+        self._wake = asyncio.Event()
+        self.stats = {"pushed": 0, "failed": 0, "replaced": 0, "last_push": 0.0}
+
+    def start(self) -> None:
+        self._client = httpx.AsyncClient(timeout=10)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def push(self, gzip_body: bytes) -> None:
+        if self._pending is not None:
+            self.stats["replaced"] += 1
+        self._pending = gzip_body
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            body, self._pending = self._pending, None
+            if body is None:
+                continue
+            try:
+                resp = await self._client.post(self._url, content=body, headers=self._headers)
+                if resp.status_code == 204:
+                    self.stats["pushed"] += 1
+                    self.stats["last_push"] = time.time()
+                    continue
+                logger.warning("Aggregator rejected snapshot: %s %s", resp.status_code, resp.text[:200])
+            except httpx.HTTPError as e:
+                logger.warning("Snapshot push failed: %s", e)
+            self.stats["failed"] += 1
+
+
+@dataclass
+class RemoteHost:
+    """Latest snapshot received from one agent, kept in its encoded forms."""
+
+    body: bytes
+    gzip_body: bytes
+    ts: float
+    received: float
+    containers: int
+
+
+class RemoteHosts:
+    """Aggregator side: the latest snapshot of every pushing agent."""
+
+    def __init__(self) -> None:
+        self._hosts: dict[str, RemoteHost] = {}
+        # (key, body, gzip body) of the last combined() result
+        self._combined: tuple[tuple, bytes, bytes] | None = None
+
+    def get(self, host: str) -> RemoteHost | None:
+        return self._hosts.get(host)
+
+    def put(self, host: str, body: bytes, gzip_body: bytes, snapshot: dict[str, Any]) -> None:
+        now = time.time()
+        self._hosts[host] = RemoteHost(body, gzip_body, snapshot.get("ts", now), now,
+                                       len(snapshot["containers"]))
+        # Forget agents that stopped pushing long ago
+        for name in [h for h, r in self._hosts.items() if now - r.received > config.FEDERATION_EVICT]:
+            del self._hosts[name]
+
+    def summary(self) -> list[dict[str, Any]]:
+        now = time.time()
+        return [
+            {"host": h, "ts": r.ts, "containers": r.containers,
+             "stale": now - r.received > config.FEDERATION_STALE}
+            for h, r in sorted(self._hosts.items())
+        ]
+
+    def combined(self, local_host: str, local_etag: str, local_body: bytes) -> tuple[str, bytes, bytes]:
+        """``{"hosts": {host: snapshot, ...}}`` spliced from the stored bytes.
+
+        Returns (etag, body, gzip body); rebuilt only when a snapshot changed.
+        """
+        key = (local_etag, *((h, r.received) for h, r in sorted(self._hosts.items())))
+        if self._combined is None or self._combined[0] != key:
+            parts = [json.dumps(local_host).encode() + b":" + local_body]
+            parts += [json.dumps(h).encode() + b":" + r.body for h, r in sorted(self._hosts.items())]
+            body = b'{"hosts":{' + b",".join(parts) + b"}}"
+            self._combined = (key, body, gzip.compress(body, GZIP_LEVEL))
+        key, body, gzip_body = self._combined
+        return f'"all-{hash(key) & 0xffffffff:x}"', body, gzip_body
+
+
+def decode_snapshot(raw: bytes, gzipped: bool) -> tuple[bytes, bytes, dict[str, Any]]:
+    """Validate a pushed snapshot; returns (json body, gzip body, parsed).
+
+    Raises ValueError for payloads that are not a dockwatch snapshot.
+    """
+    body = raw
+    if gzipped:
+        # Bounded inflate, so a small bomb cannot expand without limit
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = inflater.decompress(raw, config.FEDERATION_MAX_BODY + 1)
+        except zlib.error as e:
+            raise ValueError(f"bad gzip payload: {e}") from None
+    if len(body) > config.FEDERATION_MAX_BODY:
+        raise ValueError("snapshot too large")
+    try:
+        snapshot = json.loads(body)
+    except ValueError:
+        raise ValueError("payload is not JSON") from None
+    if (not isinstance(snapshot, dict) or not isinstance(snapshot.get("containers"), list)
+            or not isinstance(snapshot.get("host"), dict)):
+        raise ValueError("payload is not a snapshot")
+    for c in snapshot["containers"]:
+        if (not isinstance(c, dict) or not isinstance(c.get("name"), str)
+                or not isinstance(c.get("ts"), (int, float))):
+            raise ValueError("malformed container record")
+    return body, raw if gzipped else gzip.compress(body, GZIP_LEVEL), snapshot
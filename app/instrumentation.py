@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import os
+import resource
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+# Collection loop stages, in execution order
+STAGES = ("containers", "host", "store", "images", "detect", "publish")
+
+# Latency histogram bucket upper bounds, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Docker API requests made since start, by endpoint
+docker_calls: dict[str, int] = {}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def count_docker_call(endpoint: str) -> None:
+    docker_calls[endpoint] = docker_calls.get(endpoint, 0) + 1
+
+
+class Histogram:
+    """Fixed-bucket latency histogram; observing is a bisect and two adds."""
+
+    def __init__(self, bounds: tuple[float, ...] = LATENCY_BUCKETS_MS) -> None:
+        self.bounds = bounds
+        # One count per bound plus the overflow bucket
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the ``q`` quantile (max if overflowed)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def snapshot(self) -> dict[str, Any]:
+        cumulative, seen = {}, 0
+        for bound, n in zip((*self.bounds, "+Inf"), self.counts):
+            seen += n
+            cumulative[str(bound)] = seen
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": round(self.max, 3),
+            "buckets": cumulative,
+        }
+
+
+class CycleInstrumentation:
+    """Timing of the collection loop and the monitor's own resource use.
+
+    ``stage`` times one step of a cycle into its histogram; ``end_cycle``
+    closes the cycle, counts an overrun when it took longer than the
+    collection interval, and returns the per-cycle sample that is persisted
+    to ``monitor_metrics``.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.stages = {name: Histogram() for name in STAGES}
+        self.cycle = Histogram()
+        self.cycles = 0
+        self.overruns = 0
+        self.started = time.time()
+        # Stage durations of the cycle in progress
+        self._last: dict[str, float] = {}
+        self._cycle_start = 0.0
+        # (monotonic, process CPU) at the end of the previous cycle
+        self._cpu: tuple[float, float] | None = None
+        self._docker_total = 0
+        self.cpu_pct = 0.0
+
+    def begin_cycle(self) -> None:
+        self._last = {}
+        self._cycle_start = time.perf_counter()
+        if self._cpu is None:
+            self._cpu = (time.monotonic(), time.process_time())
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            self._last[name] = ms
+            self.stages[name].observe(ms)
+
+    def end_cycle(self) -> dict[str, Any]:
+        total = (time.perf_counter() - self._cycle_start) * 1000
+        self.cycle.observe(total)
+        self.cycles += 1
+        overrun = total > self.interval * 1000
+        if overrun:
+            self.overruns += 1
+
+        # Process CPU since the previous cycle, 100 per fully used core
+        now, cpu = time.monotonic(), time.process_time()
+        wall = now - self._cpu[0]
+        self.cpu_pct = (cpu - self._cpu[1]) / wall * 100 if wall > 0 else 0.0
+        self._cpu = (now, cpu)
+
+        calls = sum(docker_calls.values())
+        sample = {
+            "ts": time.time(),
+            "cycle_ms": total,
+            **{f"{name}_ms": self._last.get(name) for name in STAGES},
+            "docker_calls": calls - self._docker_total,
+            "rss": rss_bytes(),
+            "cpu_pct": self.cpu_pct,
+            "overrun": int(overrun),
+        }
+        self._docker_total = calls
+        return sample
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "uptime": time.time() - self.started,
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "cycle": self.cycle.snapshot(),
+            "stages": {name: h.snapshot() for name, h in self.stages.items()},
+            "docker_calls": dict(docker_calls),
+            "process": {
+                "rss": rss_bytes(),
+                "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                "cpu_pct": round(self.cpu_pct, 2),
+                "threads": threading.active_count(),
+            },
+        }
+
+
+def rss_bytes() -> int:
+    """Current resident set size; falls back to the peak where /proc is missing."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
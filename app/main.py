@@ -2,35 +2,68 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import math
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, AsyncIterator, Iterator
 
 import base64
+import fnmatch
 import hashlib
 import json
+import re
 import secrets
-from collections import defaultdict
 
 from fastapi import FastAPI, Query, Request
-from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 
 from app import config
 from app.alerting.detector import AnomalyDetector
-from app.alerting.telegram import send_alert
-from app.collectors.containers import collect_container_stats
+from app.alerting.rules import RuleSet
+from app.broadcast import Broadcaster
+from app.export import EXPORT_FORMATS, encode_rows, gzip_chunks
+from app.federation import (
+    HOST_HEADER,
+    HOST_NAME_PATTERN,
+    RemoteHosts,
+    SnapshotPusher,
+    decode_snapshot,
+    remote_name,
+)
+from app.instrumentation import CycleInstrumentation
+from app.sessions import FailureLog, RecentClients
+from app.metrics import OPENMETRICS_TYPE, TEXT_TYPE, MetricsExposition
+from app.snapshot import EncodedSnapshot, etag_matches
+from app.alerting.telegram import AlertDispatcher
+from app.collectors.cgroup import CGROUP_ROOT, CgroupCollector
+from app.collectors.containers import ContainerStatsStream, collect_container_stats
 from app.collectors.host import collect_host_stats
+from app.collectors.inventory import ContainerInfo, ContainerInventory
+from app.collectors.rates import RateTracker
+from app.collectors.sampler import SampleBuffers
 from app.collectors.images import collect_image_stats
 from app.storage.db import (
-    cleanup_old_data,
+    CONTAINER_FIELDS,
+    HISTORY_AGGS,
     get_alerts,
     get_container_history,
     get_host_history,
+    get_monitor_history,
+    iter_container_histories,
+    iter_container_rows,
+    load_state,
     store_alert,
     store_container_stats,
     store_host_stats,
+    store_monitor_stats,
+    store_remote_host_stats,
+    store_state,
 )
+from app.storage import retention
+from app.storage.rollup import pick_resolution, pick_source, rewind_rollups, run_rollups
+from app.storage.writer import StorageWriter
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
 logger = logging.getLogger("monitor")
@@ -38,70 +71,228 @@ logger = logging.getLogger("monitor")
 # Shared state
 _latest: dict[str, Any] = {}
 _detector = AnomalyDetector()
+_broadcaster = Broadcaster()
+_dispatcher = AlertDispatcher()
+# Federation: pushes our snapshots (agent) / holds agents' snapshots (aggregator)
+_pusher = SnapshotPusher() if config.AGGREGATOR_URL else None
+_remote = RemoteHosts()
+_metrics = MetricsExposition()
+_instr = CycleInstrumentation(config.COLLECT_INTERVAL)
+_snapshot = EncodedSnapshot({"containers": [], "host": {}, "images": {}, "anomalies": []})
 _collect_task: asyncio.Task | None = None
+_sample_task: asyncio.Task | None = None
+_retention_task: asyncio.Task | None = None
+_inventory = ContainerInventory()
+_stats_stream = ContainerStatsStream()
+_cgroup = CgroupCollector()
+_rates = RateTracker()
+# Per-container ring buffers, only in high-frequency mode
+_samples = SampleBuffers(config.HF_WINDOW, config.HF_INTERVAL) if config.HF_INTERVAL > 0 else None
+_writer = StorageWriter()
+_read_executor = ThreadPoolExecutor(config.READ_POOL_SIZE, thread_name_prefix="db-read")
+
+
+async def _read(fn, *args):
+    """Run a blocking storage query on the read pool, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_read_executor, fn, *args)
+
+
+async def _read_stream(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Drive a blocking storage generator on the read pool, one chunk per hop."""
+    try:
+        while True:
+            chunk = await _read(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        try:
+            chunks.close()
+        except ValueError:
+            pass  # still running on the pool after a disconnect; closed once collected
+
+
+async def _collect_containers() -> list[dict[str, Any]]:
+    running = _inventory.running()
+    if config.COLLECTOR_MODE == "cgroup" and _cgroup.available:
+        containers = await asyncio.to_thread(_cgroup.collect, running)
+    elif config.COLLECTOR_MODE == "oneshot":
+        containers = await collect_container_stats(running)
+    else:
+        await _stats_stream.sync(running)
+        containers = _stats_stream.snapshot()
+    _rates.apply(containers)
+    return containers
+
+
+async def _on_container_event(action: str, info: ContainerInfo, attrs: dict[str, str]) -> None:
+    """Alert on lifecycle events as they arrive instead of on the next cycle."""
+    alerts = _detector.container_event(action, info, attrs)
+    if alerts:
+        _broadcaster.publish("alerts", alerts)
+    for a in alerts:
+        _writer.submit(store_alert, a)
+    _dispatcher.enqueue(alerts)
+    _metrics.count_alerts(alerts)
+
+
+def _checkpoint_state() -> None:
+    """Queue a snapshot of detector state and alert cooldowns for the writer."""
+    _writer.submit(store_state, "detector", _detector.export_state())
+    _writer.submit(store_state, "cooldowns", dict(_dispatcher.cooldowns))
+
+
+def _restore_state() -> None:
+    """Resume from the last checkpoint so a restart does not re-alert everything."""
+    try:
+        saved = load_state("detector")
+        if saved is not None:
+            ts, state = saved
+            fresh = time.time() - ts < config.STATE_MAX_AGE
+            _detector.restore_state(state, baselines=fresh)
+            logger.info("Restored detector state from %s checkpoint",
+                        "recent" if fresh else "stale (restart counts only)")
+        saved = load_state("cooldowns")
+        if saved is not None:
+            _dispatcher.cooldowns.update(saved[1])
+    except Exception:
+        logger.exception("Could not restore saved state, starting fresh")
+
+
+async def _sampling_loop() -> None:
+    """High-frequency mode: append a sample per container every HF_INTERVAL."""
+    while True:
+        try:
+            _samples.add(await _collect_containers())
+        except Exception:
+            logger.exception("Sampling error")
+        await asyncio.sleep(config.HF_INTERVAL)
 
 
 async def _collection_loop() -> None:
     """Background loop: collect stats, detect anomalies, send alerts."""
     cycle = 0
+    last_cycle = time.time()
+    # Cycles per minute, for the once-a-minute steps at any COLLECT_INTERVAL
+    per_minute = max(60 // config.COLLECT_INTERVAL, 1)
     while True:
+        _instr.begin_cycle()
         try:
-            # Collect
-            containers = await collect_container_stats()
-            host = collect_host_stats()
-
-            # Store to SQLite
-            if containers:
-                store_container_stats(containers)
-            store_host_stats(host)
-
-            # Collect images less frequently (every 6th cycle ~ 1 min)
+            # Collect (in high-frequency mode, aggregate the samples since last cycle)
+            with _instr.stage("containers"):
+                if _samples is not None:
+                    containers = _samples.aggregate(last_cycle)
+                    last_cycle = time.time()
+                else:
+                    containers = await _collect_containers()
+            with _instr.stage("host"):
+                host = collect_host_stats()
+
+            # Queue for the SQLite writer thread
+            with _instr.stage("store"):
+                if containers:
+                    _writer.submit(store_container_stats, containers)
+                _writer.submit(store_host_stats, host)
+
+            # Collect images less frequently (~1 min; system/df is expensive)
             images: dict[str, Any] = _latest.get("images", {})
-            if cycle % 6 == 0:
-                try:
-                    images = await collect_image_stats()
-                except Exception as e:
-                    logger.warning("Image stats collection failed: %s", e)
+            if cycle % per_minute == 0:
+                with _instr.stage("images"):
+                    try:
+                        images = await collect_image_stats()
+                    except Exception as e:
+                        logger.warning("Image stats collection failed: %s", e)
 
             # Detect anomalies
-            alerts = _detector.check(containers, host)
-            for a in alerts:
-                store_alert(a)
-                await send_alert(a)
+            with _instr.stage("detect"):
+                _reload_rules()
+                labels = {info.name: info.labels for info in _inventory.running()}
+                alerts = _detector.check(containers, host, labels)
+                if _inventory.seeded:
+                    _detector.prune(_inventory.containers())
+                for a in alerts:
+                    _writer.submit(store_alert, a)
+                _dispatcher.enqueue(alerts)
+                _metrics.count_alerts(alerts)
 
             # Update shared state
-            _latest.update({
-                "containers": containers,
-                "host": host,
-                "images": images,
-                "anomalies": _detector.active_anomalies,
-                "ts": time.time(),
-            })
-
-            # Cleanup old data daily (every ~8640 cycles at 10s interval)
-            if cycle % 8640 == 0 and cycle > 0:
-                deleted = cleanup_old_data()
-                if deleted:
-                    logger.info("Cleaned up %d old records", deleted)
+            with _instr.stage("publish"):
+                _latest.update({
+                    "containers": containers,
+                    "host": host,
+                    "images": images,
+                    "anomalies": _detector.active_anomalies,
+                    "ts": time.time(),
+                })
+                _snapshot.update(_latest)
+                _metrics.update(_latest, labels)
+                _broadcaster.publish("snapshot", _snapshot.body, retain=True)
+                if _pusher is not None:
+                    _pusher.push(_snapshot.gzip_body)
+                if alerts:
+                    _broadcaster.publish("alerts", alerts)
+
+            # Fold completed buckets into the rollup tiers (~1 min)
+            if cycle % per_minute == 0:
+                _writer.submit(run_rollups)
+
+            if cycle % max(config.STATE_CHECKPOINT // config.COLLECT_INTERVAL, 1) == 0:
+                _checkpoint_state()
 
             cycle += 1
         except Exception:
             logger.exception("Collection cycle error")
 
+        # The monitor's own overhead, charted from monitor_metrics
+        sample = _instr.end_cycle()
+        if sample["overrun"]:
+            logger.warning("Collection cycle took %.0fms, longer than the %ds interval",
+                           sample["cycle_ms"], config.COLLECT_INTERVAL)
+        sample["db_commit_ms"] = _writer.last_commit_ms
+        sample["write_queue"] = _writer.queued
+        _writer.submit(store_monitor_stats, sample)
+
         await asyncio.sleep(config.COLLECT_INTERVAL)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _collect_task
+    global _collect_task, _sample_task, _retention_task
     logger.info("Starting collection loop (interval=%ds)", config.COLLECT_INTERVAL)
+    if config.COLLECTOR_MODE == "cgroup" and not _cgroup.available:
+        logger.warning("No cgroup v2 hierarchy under %s, using stats streams instead",
+                       CGROUP_ROOT)
+    _writer.start()
+    _restore_state()
+    _dispatcher.start()
+    if _pusher is not None:
+        logger.info("Pushing snapshots to %s as host %s", config.AGGREGATOR_URL, config.HOST_NAME)
+        _pusher.start()
+    _inventory.add_listener(_on_container_event)
+    await _inventory.start()
+    if _samples is not None:
+        logger.info("High-frequency sampling every %gs", config.HF_INTERVAL)
+        _sample_task = asyncio.create_task(_sampling_loop())
     _collect_task = asyncio.create_task(_collection_loop())
+    _retention_task = asyncio.create_task(retention.retention_loop(_writer))
     yield
-    _collect_task.cancel()
-    try:
-        await _collect_task
-    except asyncio.CancelledError:
-        pass
+    for task in (_sample_task, _collect_task, _retention_task):
+        if task is None:
+            continue
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await _stats_stream.stop()
+    await _inventory.stop()
+    await _dispatcher.stop()
+    if _pusher is not None:
+        await _pusher.stop()
+    # Drained by the writer before it stops
+    _checkpoint_state()
+    await asyncio.to_thread(_writer.stop)
+    _read_executor.shutdown(wait=False)
 
 
 app = FastAPI(title="Docker Monitor", lifespan=lifespan)
@@ -115,19 +306,82 @@ AUTH_FILE = Path(config.DB_PATH).parent / "auth.json"
 SETTINGS_FILE = Path(config.DB_PATH).parent / "settings.json"
 
 
-def _load_settings() -> dict:
-    if SETTINGS_FILE.exists():
+# Seconds between mtime checks of auth.json / settings.json
+CONFIG_RECHECK = 2.0
+
+
+class _JsonFile:
+    """A small JSON file kept parsed in memory.
+
+    Writes through ``save`` update the cache at once; edits made outside
+    the API are noticed by mtime, checked at most every CONFIG_RECHECK
+    seconds, so requests don't touch the disk.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._data: dict | None = None
+        self._mtime: int | None = None
+        self._checked = 0.0
+
+    def load(self) -> dict:
+        now = time.monotonic()
+        if self._data is not None and now - self._checked < CONFIG_RECHECK:
+            return self._data
+        self._checked = now
+        mtime = self._stat()
+        if self._data is None or mtime != self._mtime:
+            self._mtime = mtime
+            self._data = {}
+            if mtime is not None:
+                try:
+                    data = json.loads(self.path.read_text())
+                    if isinstance(data, dict):
+                        self._data = data
+                except Exception:
+                    pass
+        return self._data
+
+    def save(self, data: dict) -> None:
+        self.path.write_text(json.dumps(data))
+        self._data, self._mtime, self._checked = data, self._stat(), time.monotonic()
+
+    def _stat(self) -> int | None:
         try:
-            return json.loads(SETTINGS_FILE.read_text())
-        except Exception:
-            pass
-    return {}
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+
+_settings_file = _JsonFile(SETTINGS_FILE)
+_auth_file = _JsonFile(AUTH_FILE)
+
+
+def _load_settings() -> dict:
+    return _settings_file.load()
 
 
 def _save_settings(data: dict) -> None:
-    current = _load_settings()
-    current.update(data)
-    SETTINGS_FILE.write_text(json.dumps(current))
+    _settings_file.save({**_load_settings(), **data})
+
+
+# Settings dict the current alert rules were compiled from
+_rules_source: dict | None = None
+
+
+def _reload_rules(force: bool = False) -> None:
+    """Recompile alert rules when settings.json has changed since the last load."""
+    global _rules_source
+    settings = _load_settings()
+    if settings is _rules_source and not force:
+        return
+    _rules_source = settings
+    try:
+        _detector.set_rules(RuleSet(settings.get("rules")))
+    except ValueError as e:
+        logger.warning("Ignoring invalid alert rules in %s: %s", SETTINGS_FILE, e)
+        return
+    logger.info("Loaded %d alert rules", len(_detector.rules.rules))
 
 
 def _get_max_connections() -> int:
@@ -139,41 +393,42 @@ def _hash_pw(pw: str) -> str:
     return hashlib.sha256(pw.encode()).hexdigest()
 
 
+_ENV_HASH = _hash_pw(config.AUTH_PASS)
+
+
 def _load_auth() -> tuple[str, str]:
     """Load credentials: auth.json first, then env vars."""
-    if AUTH_FILE.exists():
-        try:
-            data = json.loads(AUTH_FILE.read_text())
-            return data["user"], data["hash"]
-        except Exception:
-            pass
+    data = _auth_file.load()
+    if data.get("user") and data.get("hash"):
+        return data["user"], data["hash"]
     if config.AUTH_USER and config.AUTH_PASS:
-        return config.AUTH_USER, _hash_pw(config.AUTH_PASS)
+        return config.AUTH_USER, _ENV_HASH
     return "", ""
 
 
 def _save_auth(user: str, pw: str) -> None:
-    AUTH_FILE.write_text(json.dumps({"user": user, "hash": _hash_pw(pw)}))
+    _auth_file.save({"user": user, "hash": _hash_pw(pw)})
+    # Headers verified against the old credentials must be checked again
+    _verified.clear()
 
 
-# ── Active sessions: {ip: last_seen_timestamp} ──
+# ── Active sessions: IPs seen within SESSION_TIMEOUT ──
 
-_active_sessions: dict[str, float] = {}
 SESSION_TIMEOUT = 60  # consider inactive after 60s
+SESSION_MAX = 10000  # tracked IPs; least recently seen dropped beyond this
+_active_sessions = RecentClients(SESSION_TIMEOUT, SESSION_MAX)
 
 
 def _touch_session(ip: str) -> None:
-    _active_sessions[ip] = time.time()
+    _active_sessions.touch(ip)
 
 
 def _get_active_count() -> int:
-    now = time.time()
-    return sum(1 for t in _active_sessions.values() if now - t < SESSION_TIMEOUT)
+    return len(_active_sessions)
 
 
 def _get_active_ips() -> list[str]:
-    now = time.time()
-    return [ip for ip, t in _active_sessions.items() if now - t < SESSION_TIMEOUT]
+    return _active_sessions.keys()
 
 
 def _is_connection_allowed(ip: str) -> bool:
@@ -181,17 +436,17 @@ def _is_connection_allowed(ip: str) -> bool:
     if max_conn <= 0:
         return True
     # Already active — always allowed
-    now = time.time()
-    if ip in _active_sessions and now - _active_sessions[ip] < SESSION_TIMEOUT:
+    if ip in _active_sessions:
         return True
     return _get_active_count() < max_conn
 
 
 # ── Rate limiting ──
 
-_fail_log: dict[str, list[float]] = defaultdict(list)
 RATE_MAX_FAILS = 5
 RATE_WINDOW = 60
+RATE_MAX_CLIENTS = 10000
+_fail_log = FailureLog(RATE_WINDOW, RATE_MAX_FAILS, RATE_MAX_CLIENTS)
 
 
 def _get_client_ip(request: Request) -> str:
@@ -202,13 +457,18 @@ def _get_client_ip(request: Request) -> str:
 
 
 def _is_rate_limited(ip: str) -> bool:
-    now = time.time()
-    _fail_log[ip] = [t for t in _fail_log[ip] if now - t < RATE_WINDOW]
-    return len(_fail_log[ip]) >= RATE_MAX_FAILS
+    return _fail_log.limited(ip)
+
 
+def _record_fail(ip: str) -> int:
+    return _fail_log.record(ip)
 
-def _record_fail(ip: str) -> None:
-    _fail_log[ip].append(time.time())
+
+# Authorization headers that passed verification: {header: (expires, user, hash checked against)}.
+# Browsers resend the same header on every request, so hits skip decoding and hashing.
+_verified: dict[str, tuple[float, str, str]] = {}
+AUTH_CACHE_TTL = 300
+AUTH_CACHE_MAX = 256
 
 
 def _check_auth(request: Request) -> Response | None:
@@ -224,17 +484,23 @@ def _check_auth(request: Request) -> Response | None:
         return Response(status_code=429, content="Too Many Requests. Try again later.")
 
     auth = request.headers.get("Authorization", "")
+    hit = _verified.get(auth)
+    now = time.monotonic()
+    if hit is not None and hit[0] > now and hit[1:] == (auth_user, auth_hash):
+        return None
     if auth.startswith("Basic "):
         try:
             decoded = base64.b64decode(auth[6:]).decode()
             user, pw = decoded.split(":", 1)
             if secrets.compare_digest(user, auth_user) and secrets.compare_digest(_hash_pw(pw), auth_hash):
+                if len(_verified) >= AUTH_CACHE_MAX:
+                    _verified.clear()
+                _verified[auth] = (now + AUTH_CACHE_TTL, auth_user, auth_hash)
                 return None
         except Exception:
             pass
 
-    _record_fail(ip)
-    remaining = RATE_MAX_FAILS - len(_fail_log[ip])
+    remaining = RATE_MAX_FAILS - _record_fail(ip)
     logger.warning("Auth failed from %s (%d attempts left)", ip, max(remaining, 0))
     return Response(
         status_code=401,
@@ -257,11 +523,15 @@ def _get_current_user(request: Request) -> str | None:
 
 @app.middleware("http")
 async def auth_middleware(request: Request, call_next):
-    if request.url.path == "/api/health":
+    if request.url.path in ("/api/health", "/api/ingest"):
+        # Ingest authenticates agents by token, not Basic Auth
         return await call_next(request)
     resp = _check_auth(request)
     if resp is not None:
         return resp
+    if request.url.path == "/metrics":
+        # Scrapers are not dashboard viewers; keep them out of the session count
+        return await call_next(request)
     # Connection limit check (after auth passes)
     ip = _get_client_ip(request)
     if not _is_connection_allowed(ip):
@@ -285,25 +555,291 @@ async def static_file(filename: str):
 
 
 @app.get("/api/current")
-async def api_current():
-    return JSONResponse(_latest or {"containers": [], "host": {}, "images": {}, "anomalies": []})
+async def api_current(
+    request: Request,
+    host: str | None = Query(None, description="Federated host name, or \"all\""),
+):
+    """Latest snapshot, pre-encoded once per cycle; honors If-None-Match."""
+    if not host or host == config.HOST_NAME:
+        etag, body, gzip_body = _snapshot.etag, _snapshot.body, _snapshot.gzip_body
+    elif host == "all":
+        etag, body, gzip_body = _remote.combined(config.HOST_NAME, _snapshot.etag, _snapshot.body)
+    else:
+        remote = _remote.get(host)
+        if remote is None:
+            return JSONResponse({"error": f"Unknown host {host}"}, status_code=404)
+        etag, body, gzip_body = f'"{host}-{remote.received!r}"', remote.body, remote.gzip_body
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(etag, request.headers.get("If-None-Match")):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(gzip_body, media_type="application/json", headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/metrics")
+async def metrics(request: Request):
+    """Prometheus exposition of the last cycle, rendered when it completed."""
+    if "application/openmetrics-text" in request.headers.get("Accept", ""):
+        media_type, body, gzip_body = OPENMETRICS_TYPE, _metrics.openmetrics, _metrics.openmetrics_gzip
+    else:
+        media_type, body, gzip_body = TEXT_TYPE, _metrics.text, _metrics.text_gzip
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(gzip_body, media_type=media_type, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+@app.get("/api/hosts")
+async def api_hosts():
+    """This host plus every federated agent that has pushed a snapshot."""
+    local = {"host": config.HOST_NAME, "ts": _latest.get("ts", 0),
+             "containers": len(_latest.get("containers", [])), "stale": False, "local": True}
+    return JSONResponse([local, *_remote.summary()])
+
+
+@app.post("/api/ingest")
+async def api_ingest(request: Request):
+    """Aggregator: accept one snapshot pushed by a federated agent."""
+    if not config.FEDERATION_TOKEN:
+        return JSONResponse({"error": "Federation ingest is disabled"}, status_code=404)
+    if not secrets.compare_digest(request.headers.get("Authorization", ""),
+                                  f"Bearer {config.FEDERATION_TOKEN}"):
+        return Response(status_code=401, content="Unauthorized")
+    host = request.headers.get(HOST_HEADER, "").strip()
+    if not HOST_NAME_PATTERN.fullmatch(host) or host in (config.HOST_NAME, "all"):
+        return JSONResponse({"error": f"Invalid {HOST_HEADER}"}, status_code=400)
+    if int(request.headers.get("Content-Length") or 0) > config.FEDERATION_MAX_BODY:
+        return Response(status_code=413)
+    raw = await request.body()
+    try:
+        # Inflate and parse off the event loop so big pushes don't stall others
+        body, gzip_body, snap = await asyncio.to_thread(
+            decode_snapshot, raw, request.headers.get("Content-Encoding") == "gzip")
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    _remote.put(host, body, gzip_body, snap)
+    if snap["containers"]:
+        _writer.submit(store_container_stats,
+                       [{**c, "name": remote_name(host, c["name"])} for c in snap["containers"]])
+        # Samples are stamped by the agent's clock: a late push (retries,
+        # clock skew) can land below the rollup watermarks, so rewind them
+        oldest = min(c["ts"] for c in snap["containers"])
+        if oldest < time.time() - 2 * config.COLLECT_INTERVAL:
+            _writer.submit(rewind_rollups, "container", oldest)
+    if "ts" in snap["host"]:
+        _writer.submit(store_remote_host_stats, host, snap["host"])
+    return Response(status_code=204)
+
+
+# Longest window any rollup tier retains
+HISTORY_MAX_HOURS = 24 * max(config.ROLLUP_TIERS.values())
+# Most buckets a points= / step= history request returns
+HISTORY_MAX_BUCKETS = 5000
+# agg= values accepted by the history endpoints
+AGG_PATTERN = f"^({'|'.join(HISTORY_AGGS)})$"
+
+
+def _history_step(hours: float, points: int | None, step: int | None) -> int:
+    """Bucket width in seconds for a points= / step= request (0 = neither given)."""
+    if not points and not step:
+        return 0
+    window = hours * 3600
+    step = step or math.ceil(window / points)
+    return max(step, config.COLLECT_INTERVAL, math.ceil(window / HISTORY_MAX_BUCKETS))
+
+
+def _metric_fields(fields: str | None) -> list[str] | None:
+    """Requested container metric columns (all by default); None when none is valid."""
+    if not fields:
+        return list(CONTAINER_FIELDS)
+    return [f for f in fields.split(",") if f in CONTAINER_FIELDS] or None
+
+
+SSE_HEARTBEAT = 15  # seconds between keep-alive comments on idle streams
+
+
+@app.get("/api/stream")
+async def api_stream(request: Request):
+    """Server-Sent Events: a "snapshot" per collection cycle plus new "alerts"."""
+    ip = _get_client_ip(request)
+    q = _broadcaster.subscribe()
 
+    async def events():
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(q.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    frame = b": ping\n\n"
+                # An open stream keeps its viewer counted as an active session
+                _touch_session(ip)
+                yield frame
+        finally:
+            _broadcaster.unsubscribe(q)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-@app.get("/api/history/{name}")
-async def api_container_history(name: str, hours: float = Query(1, ge=0.1, le=168)):
-    data = get_container_history(name, hours)
-    return JSONResponse(data)
+
+@app.get("/api/live/{name}")
+async def api_live(name: str, seconds: float = Query(config.HF_WINDOW, gt=0, le=config.HF_WINDOW)):
+    """Recent high-frequency samples for one container, straight from its ring buffer."""
+    if _samples is None:
+        return JSONResponse({"error": "High-frequency mode is off (set HF_INTERVAL)"}, status_code=404)
+    data = _samples.series(name, seconds, time.time())
+    if data is None:
+        return JSONResponse({"error": f"No samples for {name}"}, status_code=404)
+    return JSONResponse({"interval": config.HF_INTERVAL, "columns": data})
+
+
+def _history_response(data: list | dict, res: int, since: float | None) -> JSONResponse:
+    """Wrap history rows; ``next_since`` is the cursor for the following delta fetch."""
+    ts = data["ts"] if isinstance(data, dict) else [r["ts"] for r in data[-1:]]
+    next_since = ts[-1] if ts else since
+    step = str(res or config.COLLECT_INTERVAL)
+    if isinstance(data, dict):
+        return JSONResponse({"resolution": int(step), "next_since": next_since, "columns": data})
+    headers = {"X-Resolution": step}
+    if next_since is not None:
+        headers["X-Next-Since"] = repr(next_since)
+    return JSONResponse(data, headers=headers)
+
+
+def _select_labels(selector: str) -> list[str] | None:
+    """Running containers whose labels match every ``key=value`` (globs allowed) of ``selector``."""
+    terms = []
+    for term in selector.split(","):
+        key, sep, value = term.strip().partition("=")
+        if not sep or not key:
+            return None
+        terms.append((key, value))
+    return [info.name for info in _inventory.running()
+            if all(k in info.labels and fnmatch.fnmatchcase(info.labels[k], v) for k, v in terms)]
+
+
+def _encode_histories(histories: Iterator[tuple[str, dict[str, list]]], res: int) -> Iterator[bytes]:
+    yield b'{"resolution":%d,"containers":{' % res
+    sep = b""
+    for name, columns in histories:
+        yield sep + json.dumps(name).encode() + b":" + json.dumps(columns, separators=(",", ":")).encode()
+        sep = b","
+    yield b"}}"
+
+
+@app.get("/api/history")
+async def api_batch_history(
+    names: str | None = Query(None, description="Comma-separated container names, or \"all\""),
+    selector: str | None = Query(None, description="Label selector: key=value[,key=value...]"),
+    hours: float = Query(1, ge=0.1, le=HISTORY_MAX_HOURS),
+    fields: str | None = Query(None, description="Comma-separated metric columns"),
+    since: float | None = Query(None, description="Only samples newer than this ts"),
+    host: str | None = Query(None, description="Federated host name"),
+    points: int | None = Query(None, ge=1, le=HISTORY_MAX_BUCKETS, description="Aggregate into this many buckets"),
+    step: int | None = Query(None, ge=1, description="Aggregate into buckets of this many seconds"),
+    agg: str = Query("avg", pattern=AGG_PATTERN),
+):
+    """Columnar history of many containers from one query, streamed per container."""
+    remote = host if host and host != config.HOST_NAME else None
+    if selector:
+        if remote:
+            return JSONResponse({"error": "Label selectors only apply to this host"}, status_code=400)
+        wanted = _select_labels(selector)
+        if wanted is None:
+            return JSONResponse({"error": "selector must be key=value[,key=value...]"}, status_code=400)
+    elif names == "all":
+        wanted = None
+    elif names:
+        wanted = [n for n in names.split(",") if n]
+    else:
+        return JSONResponse({"error": "Give names (or \"all\") or a label selector"}, status_code=400)
+    cols = _metric_fields(fields)
+    if cols is None:
+        return JSONResponse({"error": "No valid fields"}, status_code=400)
+    step = _history_step(hours, points, step)
+    res = pick_source(hours, step, agg) if step else pick_resolution(hours)
+    histories = iter_container_histories(wanted, remote_name(remote, "") if remote else "", hours,
+                                         cols, res, since, step, agg)
+    chunks = _encode_histories(histories, step or res or config.COLLECT_INTERVAL)
+    return StreamingResponse(_read_stream(chunks), media_type="application/json")
+
+
+@app.get("/api/export")
+async def api_export(
+    names: str = Query("all", description="Comma-separated container names, or \"all\""),
+    start: float | None = Query(None, description="Only samples after this ts"),
+    end: float | None = Query(None, description="Only samples up to this ts (default now)"),
+    fields: str | None = Query(None, description="Comma-separated metric columns"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Download as a .gz file"),
+    host: str | None = Query(None, description="Federated host name"),
+):
+    """Raw container samples streamed from the database cursor, in constant memory."""
+    remote = host if host and host != config.HOST_NAME else None
+    wanted = None if names == "all" else [n for n in names.split(",") if n]
+    cols = [f for f in (fields.split(",") if fields else CONTAINER_FIELDS) if f in CONTAINER_FIELDS]
+    if not cols:
+        return JSONResponse({"error": "No valid fields"}, status_code=400)
+    rows = iter_container_rows(wanted, remote_name(remote, "") if remote else "", start or 0, end, cols)
+    chunks = encode_rows(["name", "ts", *cols], rows, format)
+    media_type, ext = EXPORT_FORMATS[format]
+    # Host names come from the query string: keep the header's quoting intact
+    label = re.sub(r"[^A-Za-z0-9._-]", "_", remote or config.HOST_NAME)
+    filename = f"dockwatch-{label}-{time.strftime('%Y%m%d-%H%M%S')}.{ext}"
+    if gzip:
+        chunks, media_type, filename = gzip_chunks(chunks), "application/gzip", filename + ".gz"
+    return StreamingResponse(_read_stream(chunks), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 @app.get("/api/history/host")
-async def api_host_history(hours: float = Query(1, ge=0.1, le=168)):
-    data = get_host_history(hours)
-    return JSONResponse(data)
+async def api_host_history(
+    hours: float = Query(1, ge=0.1, le=HISTORY_MAX_HOURS),
+    since: float | None = Query(None, description="Only samples newer than this ts"),
+    format: str = Query("rows", pattern="^(rows|columns)$"),
+    host: str | None = Query(None, description="Federated host name"),
+    points: int | None = Query(None, ge=1, le=HISTORY_MAX_BUCKETS, description="Aggregate into this many buckets"),
+    step: int | None = Query(None, ge=1, description="Aggregate into buckets of this many seconds"),
+    agg: str = Query("avg", pattern=AGG_PATTERN),
+):
+    step = _history_step(hours, points, step)
+    res = pick_source(hours, step, agg) if step else pick_resolution(hours)
+    remote = host if host and host != config.HOST_NAME else None
+    data = await _read(get_host_history, hours, res, since, format == "columns", remote, step, agg)
+    return _history_response(data, step or res, since)
+
+
+@app.get("/api/history/{name}")
+async def api_container_history(
+    name: str,
+    hours: float = Query(1, ge=0.1, le=HISTORY_MAX_HOURS),
+    fields: str | None = Query(None, description="Comma-separated metric columns"),
+    since: float | None = Query(None, description="Only samples newer than this ts"),
+    format: str = Query("rows", pattern="^(rows|columns)$"),
+    host: str | None = Query(None, description="Federated host name"),
+    points: int | None = Query(None, ge=1, le=HISTORY_MAX_BUCKETS, description="Aggregate into this many buckets"),
+    step: int | None = Query(None, ge=1, description="Aggregate into buckets of this many seconds"),
+    agg: str = Query("avg", pattern=AGG_PATTERN),
+):
+    cols = _metric_fields(fields)
+    if cols is None:
+        return JSONResponse({"error": "No valid fields"}, status_code=400)
+    prefix = remote_name(host, "") if host and host != config.HOST_NAME else ""
+    step = _history_step(hours, points, step)
+    res = pick_source(hours, step, agg) if step else pick_resolution(hours)
+    data = await _read(get_container_history, name, hours, cols,
+                       res, since, format == "columns", step, agg, prefix)
+    return _history_response(data, step or res, since)
 
 
 @app.get("/api/alerts")
 async def api_alerts(hours: float = Query(24, ge=1, le=168)):
-    data = get_alerts(hours)
+    data = await _read(get_alerts, hours)
     return JSONResponse(data)
 
 
@@ -352,6 +888,7 @@ async def api_session(request: Request):
 async def api_get_settings():
     return JSONResponse({
         "max_connections": _get_max_connections(),
+        "rules": _load_settings().get("rules", []),
     })
 
 
@@ -372,11 +909,21 @@ async def api_update_settings(request: Request):
         except (ValueError, TypeError):
             return JSONResponse({"ok": False, "error": "max_connections must be a number"}, status_code=400)
 
+    if "rules" in body:
+        if not isinstance(body["rules"], list):
+            return JSONResponse({"ok": False, "error": "rules must be a list"}, status_code=400)
+        try:
+            RuleSet(body["rules"])
+        except ValueError as e:
+            return JSONResponse({"ok": False, "error": str(e)}, status_code=400)
+        updated["rules"] = body["rules"]
+
     if not updated:
         return JSONResponse({"ok": False, "error": "No valid settings provided"}, status_code=400)
 
     _save_settings(updated)
     logger.info("Settings updated: %s", updated)
+    _reload_rules(force=True)
     return JSONResponse({"ok": True, "settings": updated})
 
 
@@ -386,6 +933,27 @@ GH_REPO = "deep-on/dockwatch"
 GH_CACHE_TTL = 600
 
 
+@app.get("/api/internal/stats")
+async def api_internal_stats():
+    """The monitor's own overhead: stage latencies, Docker calls, DB writes, memory."""
+    auth = {"sessions": len(_active_sessions), "sessions_evicted": _active_sessions.evicted,
+            "fail_log": len(_fail_log), "fail_log_evicted": _fail_log.evicted,
+            "verified_headers": len(_verified)}
+    federation = {"host": config.HOST_NAME, "agents": len(_remote.summary()),
+                  "push": _pusher.stats if _pusher is not None else None}
+    return JSONResponse({**_instr.stats(), "auth": auth, "storage": _writer.stats(),
+                         "retention": retention.progress, "alerts": _dispatcher.stats(),
+                         "federation": federation, "sse_subscribers": _broadcaster.subscriber_count})
+
+
+@app.get("/api/internal/history")
+async def api_internal_history(hours: float = Query(1, ge=0.1, le=config.RETENTION_DAYS * 24)):
+    """Per-cycle overhead samples for charting, bucketed like the history endpoints."""
+    res = pick_resolution(hours)
+    data = await _read(get_monitor_history, hours, res)
+    return _history_response(data, res, None)
+
+
 @app.get("/api/github-stats")
 async def api_github_stats():
     import httpx as _httpx
@@ -416,4 +984,5 @@ async def api_github_stats():
 
 @app.get("/api/health")
 async def api_health():
-    return {"status": "ok", "uptime_cycles": _latest.get("ts", 0)}
+    # Unauthenticated: liveness only, internals are under /api/internal/stats
+    return {"status": "ok", "last_cycle": _latest.get("ts", 0)}
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import gzip
+from typing import Any
+
+from app.alerting.rules import PROJECT_LABEL
+from app.snapshot import GZIP_LEVEL
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+TEXT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# (metric, record field, type, help) rendered per container
+CONTAINER_METRICS = (
+    ("dockwatch_container_cpu_percent", "cpu_pct", "gauge", "CPU usage, 100 per fully used core"),
+    ("dockwatch_container_memory_usage_bytes", "mem_usage", "gauge", "Memory usage excluding reclaimable cache"),
+    ("dockwatch_container_memory_limit_bytes", "mem_limit", "gauge", "Memory limit"),
+    ("dockwatch_container_memory_percent", "mem_pct", "gauge", "Memory usage as a percentage of the limit"),
+    ("dockwatch_container_network_receive_bytes", "net_rx", "counter", "Bytes received"),
+    ("dockwatch_container_network_transmit_bytes", "net_tx", "counter", "Bytes transmitted"),
+    ("dockwatch_container_network_receive_packets", "net_rx_packets", "counter", "Packets received"),
+    ("dockwatch_container_network_transmit_packets", "net_tx_packets", "counter", "Packets transmitted"),
+    ("dockwatch_container_blkio_read_bytes", "blk_read", "counter", "Block device bytes read"),
+    ("dockwatch_container_blkio_write_bytes", "blk_write", "counter", "Block device bytes written"),
+    ("dockwatch_container_restarts", "restart_count", "counter", "Restarts by the Docker daemon"),
+)
+
+# (metric, images field, help)
+IMAGE_METRICS = (
+    ("dockwatch_images", "image_count", "Number of images"),
+    ("dockwatch_images_size_bytes", "image_size", "Total size of all images"),
+    ("dockwatch_build_cache_size_bytes", "cache_size", "Total size of the build cache"),
+    ("dockwatch_volumes", "volume_count", "Number of volumes"),
+    ("dockwatch_volumes_size_bytes", "volume_size", "Total size of all volumes"),
+    ("dockwatch_containers_rw_size_bytes", "container_rw_size", "Total size of container writable layers"),
+)
+
+
+class MetricsExposition:
+    """The ``/metrics`` body, rendered once per cycle instead of per scrape.
+
+    Keeps both the OpenMetrics and the classic Prometheus text rendering
+    (they differ only in counter TYPE lines and the ``# EOF`` marker), each
+    with a gzip copy, plus running alert totals by type.
+    """
+
+    def __init__(self) -> None:
+        self.alert_totals: dict[str, int] = {}
+        self.update({}, {})
+
+    def count_alerts(self, alerts: list[dict[str, Any]]) -> None:
+        for a in alerts:
+            self.alert_totals[a["type"]] = self.alert_totals.get(a["type"], 0) + 1
+
+    def update(self, latest: dict[str, Any], labels: dict[str, dict[str, str]]) -> None:
+        """Render from the cycle snapshot; ``labels`` maps names to Docker labels."""
+        families = _families(latest, labels, self.alert_totals)
+        self.openmetrics = _encode(families, openmetrics=True)
+        self.text = _encode(families, openmetrics=False)
+        self.openmetrics_gzip = gzip.compress(self.openmetrics, GZIP_LEVEL)
+        self.text_gzip = gzip.compress(self.text, GZIP_LEVEL)
+
+
+def _families(
+    latest: dict[str, Any],
+    labels: dict[str, dict[str, str]],
+    alert_totals: dict[str, int],
+) -> list[tuple[str, str, str, list[str]]]:
+    """(name, type, help, sample lines) for every metric family."""
+    containers = latest.get("containers", [])
+    # Label set per container, escaped once and shared by all its samples
+    label_sets = []
+    for c in containers:
+        project = labels.get(c["name"], {}).get(PROJECT_LABEL, "")
+        label_sets.append(
+            f'name="{_esc(c["name"])}",image="{_esc(c.get("image", ""))}",project="{_esc(project)}"'
+        )
+
+    families = []
+    for metric, field, kind, help_text in CONTAINER_METRICS:
+        sample = f"{metric}_total" if kind == "counter" else metric
+        lines = [
+            f"{sample}{{{ls}}} {_num(c.get(field))}"
+            for c, ls in zip(containers, label_sets)
+            if c.get(field) is not None
+        ]
+        families.append((metric, kind, help_text, lines))
+
+    host = latest.get("host", {})
+    host_lines = []
+    for metric, value, help_text in (
+        ("dockwatch_host_cpu_temperature_celsius", host.get("cpu_temp"), "CPU temperature"),
+        ("dockwatch_host_gpu_temperature_celsius", host.get("gpu_temp"), "GPU temperature"),
+        ("dockwatch_host_cpu_cores", host.get("cpu_cores"), "Logical CPU count"),
+    ):
+        if value is not None:
+            host_lines.append((metric, help_text, [f"{metric} {_num(value)}"]))
+    load = host.get("load_avg") or []
+    if len(load) == 3:
+        host_lines.append(("dockwatch_host_load_average", "Load average",
+                           [f'dockwatch_host_load_average{{period="{p}"}} {_num(v)}'
+                            for p, v in zip(("1m", "5m", "15m"), load)]))
+    disks = host.get("disk") or []
+    for metric, key, help_text in (("dockwatch_host_disk_total_bytes", "total", "Filesystem size"),
+                                   ("dockwatch_host_disk_used_bytes", "used", "Filesystem bytes used")):
+        host_lines.append((metric, help_text,
+                           [f'{metric}{{mount="{_esc(d["mount"])}"}} {_num(d[key])}' for d in disks]))
+    families += [(m, "gauge", h, lines) for m, h, lines in host_lines]
+
+    images = latest.get("images") or {}
+    families += [(m, "gauge", h, [f"{m} {_num(images[k])}"])
+                 for m, k, h in IMAGE_METRICS if images.get(k) is not None]
+
+    active: dict[str, int] = {}
+    for a in latest.get("anomalies", []):
+        active[a["type"]] = active.get(a["type"], 0) + 1
+    families.append(("dockwatch_anomalies_active", "gauge", "Anomalies active in the last cycle",
+                     [f'dockwatch_anomalies_active{{type="{_esc(t)}"}} {n}' for t, n in sorted(active.items())]))
+    families.append(("dockwatch_alerts", "counter", "Alerts raised since start",
+                     [f'dockwatch_alerts_total{{type="{_esc(t)}"}} {n}' for t, n in sorted(alert_totals.items())]))
+    if "ts" in latest:
+        families.append(("dockwatch_last_collection_timestamp_seconds", "gauge",
+                         "Time of the last collection cycle",
+                         [f"dockwatch_last_collection_timestamp_seconds {_num(latest['ts'])}"]))
+    return families
+
+
+def _encode(families: list[tuple[str, str, str, list[str]]], openmetrics: bool) -> bytes:
+    out = []
+    for name, kind, help_text, lines in families:
+        # The classic format names counter families by their sample name
+        family = name if openmetrics or kind != "counter" else f"{name}_total"
+        out.append(f"# HELP {family} {help_text}.")
+        out.append(f"# TYPE {family} {kind}")
+        out.extend(lines)
+    if openmetrics:
+        out.append("# EOF")
+    return ("\n".join(out) + "\n").encode()
+
+
+def _esc(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: Any) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
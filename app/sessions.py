@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict, deque
+
+
+class RecentClients:
+    """Clients seen within the last ``ttl`` seconds, kept in last-seen order.
+
+    A touch moves the client to the end, so expired entries always sit at
+    the front and are evicted from there as the table is used: membership
+    and counting are O(1) amortized. Beyond ``capacity`` entries the least
+    recently seen are dropped, so scanning traffic cannot grow the table.
+    """
+
+    def __init__(self, ttl: float, capacity: int) -> None:
+        self.ttl = ttl
+        self.capacity = capacity
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self.evicted = 0
+
+    def touch(self, key: str) -> None:
+        self._seen[key] = time.monotonic()
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+            self.evicted += 1
+
+    def prune(self) -> None:
+        cutoff = time.monotonic() - self.ttl
+        seen = self._seen
+        while seen and next(iter(seen.values())) <= cutoff:
+            seen.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        self.prune()
+        return key in self._seen
+
+    def __len__(self) -> int:
+        self.prune()
+        return len(self._seen)
+
+    def keys(self) -> list[str]:
+        self.prune()
+        return list(self._seen)
+
+
+class FailureLog:
+    """Recent failures per client for rate limiting, bounded like RecentClients.
+
+    Each client keeps at most ``limit`` timestamps; clients are ordered by
+    their latest failure and dropped once it is older than ``window``.
+    """
+
+    def __init__(self, window: float, limit: int, capacity: int) -> None:
+        self.window = window
+        self.limit = limit
+        self.capacity = capacity
+        self._fails: OrderedDict[str, deque[float]] = OrderedDict()
+        self.evicted = 0
+
+    def record(self, key: str) -> int:
+        """Count a failure; returns the client's failures within the window."""
+        fails = self._fails.get(key)
+        if fails is None:
+            fails = self._fails[key] = deque(maxlen=self.limit)
+        fails.append(time.monotonic())
+        self._fails.move_to_end(key)
+        while len(self._fails) > self.capacity:
+            self._fails.popitem(last=False)
+            self.evicted += 1
+        return self.count(key)
+
+    def count(self, key: str) -> int:
+        self.prune()
+        fails = self._fails.get(key)
+        if not fails:
+            return 0
+        cutoff = time.monotonic() - self.window
+        return sum(1 for t in fails if t > cutoff)
+
+    def limited(self, key: str) -> bool:
+        return self.count(key) >= self.limit
+
+    def prune(self) -> None:
+        cutoff = time.monotonic() - self.window
+        fails = self._fails
+        while fails and next(iter(fails.values()))[-1] <= cutoff:
+            fails.popitem(last=False)
+
+    def __len__(self) -> int:
+        self.prune()
+        return len(self._fails)
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import gzip
+import json
+import time
+from typing import Any
+
+# Fast setting: the body is recompressed every cycle, not per request
+GZIP_LEVEL = 5
+
+
+class EncodedSnapshot:
+    """The current cycle's snapshot, encoded once for every reader.
+
+    Holds the JSON bytes, a gzip copy and an ETag that changes with each
+    update, so ``/api/current`` and the SSE stream never re-serialize.
+    """
+
+    def __init__(self, initial: dict[str, Any]) -> None:
+        self._epoch = f"{int(time.time()):x}"
+        self.version = 0
+        self.update(initial)
+
+    def update(self, data: dict[str, Any]) -> None:
+        self.body = json.dumps(data, separators=(",", ":")).encode()
+        self.gzip_body = gzip.compress(self.body, GZIP_LEVEL)
+        self.version += 1
+        # Epoch keeps ETags from colliding across restarts
+        self.etag = f'"{self._epoch}-{self.version}"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (
+        tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+    )
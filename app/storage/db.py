@@ -1,39 +1,180 @@
 from __future__ import annotations
 
+import itertools
 import json
+import logging
+import math
+import queue
 import sqlite3
 import time
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Iterator
 
 from app import config
 
-_conn: sqlite3.Connection | None = None
+logger = logging.getLogger(__name__)
 
+# Idle read-only connections; at most one per concurrent reader thread
+_read_pool: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
 
-def get_conn() -> sqlite3.Connection:
-    global _conn
-    if _conn is None:
-        _conn = sqlite3.connect(config.DB_PATH, check_same_thread=False)
-        _conn.row_factory = sqlite3.Row
-        _conn.execute("PRAGMA journal_mode=WAL")
-        _init_tables(_conn)
-    return _conn
+
+def connect() -> sqlite3.Connection:
+    """Open a WAL connection with the schema in place."""
+    conn = sqlite3.connect(config.DB_PATH, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # Only takes effect on a fresh file (so before WAL writes the header);
+    # existing ones are converted below
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL stays consistent without an fsync per commit; checkpoints still sync
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _init_tables(conn)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        logger.info("Converting database to incremental auto-vacuum (one-time VACUUM)")
+        conn.execute("VACUUM")
+    return conn
+
+
+@contextmanager
+def read_conn() -> Iterator[sqlite3.Connection]:
+    """Borrow a read-only WAL connection from the pool.
+
+    Readers see the last committed snapshot and never contend with the
+    writer thread. Call from a worker thread, not the event loop.
+    """
+    try:
+        conn = _read_pool.get_nowait()
+    except queue.Empty:
+        conn = sqlite3.connect(f"file:{config.DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        _read_pool.put(conn)
+
+
+# Numeric columns of container_metrics, in storage order
+CONTAINER_FIELDS = (
+    "cpu_pct", "mem_usage", "mem_limit", "mem_pct",
+    "net_rx", "net_tx", "blk_read", "blk_write", "restart_count",
+    "cpu_pct_max",
+    "net_rx_rate", "net_tx_rate", "net_rx_pps", "net_tx_pps",
+    "blk_read_rate", "blk_write_rate", "blk_read_iops", "blk_write_iops",
+)
+
+# Cumulative counters: rollups report the bucket's last value instead of the mean
+COUNTER_FIELDS = ("net_rx", "net_tx", "blk_read", "blk_write", "restart_count")
+
+# Numeric columns of host_metrics after ts, in storage order
+HOST_FIELDS = (
+    "cpu_temp", "gpu_temp", "load_1", "load_5", "load_15",
+    "cpu_cores", "disk_total", "disk_used", "disk_pct",
+)
+
+# Numeric columns of monitor_metrics after ts: the collection loop's own
+# per-cycle timings (ms) and resource use, see instrumentation.py
+MONITOR_FIELDS = (
+    "cycle_ms", "containers_ms", "host_ms", "store_ms", "images_ms", "detect_ms", "publish_ms",
+    "db_commit_ms", "write_queue", "docker_calls", "rss", "cpu_pct", "overrun",
+)
+
+# Per-bucket aggregations of history queries with a step (see _bucketed)
+HISTORY_AGGS = ("avg", "max", "p95")
+
+# Aggregates kept per field in the rollup tables
+ROLLUP_AGGS = ("min", "max", "avg", "last")
+
+# Container names interned in the containers dimension table: {name: id}
+_name_ids: dict[str, int] = {}
 
 
 def _init_tables(conn: sqlite3.Connection) -> None:
     conn.executescript("""
-        CREATE TABLE IF NOT EXISTS container_stats (
+        CREATE TABLE IF NOT EXISTS containers (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            image TEXT NOT NULL DEFAULT ''
+        );
+
+        CREATE TABLE IF NOT EXISTS container_metrics (
+            container_id INTEGER NOT NULL,
             ts REAL NOT NULL,
-            name TEXT NOT NULL,
-            data TEXT NOT NULL
+            cpu_pct REAL,
+            mem_usage INTEGER,
+            mem_limit INTEGER,
+            mem_pct REAL,
+            net_rx INTEGER,
+            net_tx INTEGER,
+            blk_read INTEGER,
+            blk_write INTEGER,
+            restart_count INTEGER,
+            cpu_pct_max REAL,
+            net_rx_rate REAL,
+            net_tx_rate REAL,
+            net_rx_pps REAL,
+            net_tx_pps REAL,
+            blk_read_rate REAL,
+            blk_write_rate REAL,
+            blk_read_iops REAL,
+            blk_write_iops REAL,
+            PRIMARY KEY (container_id, ts)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_cm_ts ON container_metrics(ts);
+
+        CREATE TABLE IF NOT EXISTS host_metrics (
+            ts REAL PRIMARY KEY,
+            cpu_temp REAL,
+            gpu_temp REAL,
+            load_1 REAL,
+            load_5 REAL,
+            load_15 REAL,
+            cpu_cores INTEGER,
+            disk_total INTEGER,
+            disk_used INTEGER,
+            disk_pct REAL
+        ) WITHOUT ROWID;
+
+        -- Host samples pushed by federated agents (see federation.py)
+        CREATE TABLE IF NOT EXISTS remote_host_metrics (
+            host TEXT NOT NULL,
+            ts REAL NOT NULL,
+            %s,
+            PRIMARY KEY (host, ts)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS monitor_metrics (
+            ts REAL PRIMARY KEY,
+            %s
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS container_rollup (
+            res INTEGER NOT NULL,
+            container_id INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            n INTEGER NOT NULL,
+            %s,
+            PRIMARY KEY (res, container_id, ts)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_cr_res_ts ON container_rollup(res, ts);
+
+        CREATE TABLE IF NOT EXISTS host_rollup (
+            res INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            n INTEGER NOT NULL,
+            %s,
+            PRIMARY KEY (res, ts)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            watermark REAL NOT NULL
         );
-        CREATE INDEX IF NOT EXISTS idx_cs_name_ts ON container_stats(name, ts);
 
-        CREATE TABLE IF NOT EXISTS host_stats (
+        CREATE TABLE IF NOT EXISTS monitor_state (
+            name TEXT PRIMARY KEY,
             ts REAL NOT NULL,
             data TEXT NOT NULL
         );
-        CREATE INDEX IF NOT EXISTS idx_hs_ts ON host_stats(ts);
 
         CREATE TABLE IF NOT EXISTS alerts (
             ts REAL NOT NULL,
@@ -43,66 +184,492 @@ def _init_tables(conn: sqlite3.Connection) -> None:
             msg TEXT
         );
         CREATE INDEX IF NOT EXISTS idx_alerts_ts ON alerts(ts);
-    """)
+    """ % (",\n            ".join(f"{f} REAL" for f in HOST_FIELDS),
+           ",\n            ".join(f"{f} REAL" for f in MONITOR_FIELDS),
+           _rollup_columns(CONTAINER_FIELDS), _rollup_columns(HOST_FIELDS)))
+    _add_columns(conn, "container_metrics", CONTAINER_FIELDS)
+    _add_columns(conn, "container_rollup",
+                 [f"{f}_{agg}" for f in CONTAINER_FIELDS for agg in ROLLUP_AGGS])
+    _migrate_json_tables(conn)
+
+
+def _add_columns(conn: sqlite3.Connection, table: str, columns: tuple[str, ...] | list[str]) -> None:
+    """Add metric columns introduced after ``table`` was created."""
+    have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    for col in columns:
+        if col not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} REAL")
+
+
+def _rollup_columns(fields: tuple[str, ...]) -> str:
+    return ",\n            ".join(f"{f}_{agg} REAL" for f in fields for agg in ROLLUP_AGGS)
+
+
+def _migrate_json_tables(conn: sqlite3.Connection) -> None:
+    """Move rows from the old JSON-blob tables into the columnar ones."""
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "container_stats" in tables:
+        with conn:
+            conn.execute("""
+                INSERT OR IGNORE INTO containers (name, image)
+                SELECT name, json_extract(data, '$.image') FROM container_stats GROUP BY name
+            """)
+            cols = ", ".join(CONTAINER_FIELDS)
+            extracts = ", ".join(f"json_extract(s.data, '$.{f}')" for f in CONTAINER_FIELDS)
+            n = conn.execute(f"""
+                INSERT OR IGNORE INTO container_metrics (container_id, ts, {cols})
+                SELECT c.id, s.ts, {extracts}
+                FROM container_stats s JOIN containers c ON c.name = s.name
+            """).rowcount
+            conn.execute("DROP TABLE container_stats")
+        logger.info("Migrated %d container_stats rows to container_metrics", n)
+    if "host_stats" in tables:
+        with conn:
+            n = conn.execute("""
+                INSERT OR IGNORE INTO host_metrics
+                SELECT ts,
+                       json_extract(data, '$.cpu_temp'), json_extract(data, '$.gpu_temp'),
+                       json_extract(data, '$.load_avg[0]'), json_extract(data, '$.load_avg[1]'),
+                       json_extract(data, '$.load_avg[2]'), json_extract(data, '$.cpu_cores'),
+                       json_extract(data, '$.disk[0].total'), json_extract(data, '$.disk[0].used'),
+                       json_extract(data, '$.disk[0].pct')
+                FROM host_stats
+            """).rowcount
+            conn.execute("DROP TABLE host_stats")
+        logger.info("Migrated %d host_stats rows to host_metrics", n)
+
+
+def _container_id(conn: sqlite3.Connection, name: str, image: str = "") -> int:
+    cid = _name_ids.get(name)
+    if cid is None:
+        conn.execute("INSERT OR IGNORE INTO containers (name, image) VALUES (?, ?)", (name, image))
+        cid = conn.execute("SELECT id FROM containers WHERE name = ?", (name,)).fetchone()[0]
+        _name_ids[name] = cid
+    return cid
+
+
+def prune_container_names(conn: sqlite3.Connection) -> int:
+    """Drop interned names with no rows left in the series tables (writer job)."""
+    gone = conn.execute("""
+        SELECT id, name FROM containers c
+        WHERE NOT EXISTS (SELECT 1 FROM container_metrics WHERE container_id = c.id)
+          AND NOT EXISTS (SELECT 1 FROM container_rollup r
+                          WHERE r.res IN (%s) AND r.container_id = c.id)
+    """ % ", ".join(str(res) for res in config.ROLLUP_TIERS)).fetchall()
+    conn.executemany("DELETE FROM containers WHERE id = ?", [(cid,) for cid, _ in gone])
+    for _, name in gone:
+        _name_ids.pop(name, None)
+    return len(gone)
+
+
+# The store_* functions run on the storage writer thread (see writer.py),
+# which owns ``conn`` and commits whole batches.
+
+def store_container_stats(conn: sqlite3.Connection, stats: list[dict[str, Any]]) -> None:
+    rows = [
+        (_container_id(conn, s["name"], s.get("image", "")), s["ts"],
+         *(s.get(f) for f in CONTAINER_FIELDS))
+        for s in stats
+    ]
+    placeholders = ", ".join("?" * (len(CONTAINER_FIELDS) + 2))
+    # OR IGNORE: a stalled stats stream can repeat the previous sample's ts
+    conn.executemany(
+        f"INSERT OR IGNORE INTO container_metrics (container_id, ts, {', '.join(CONTAINER_FIELDS)}) "
+        f"VALUES ({placeholders})",
+        rows,
+    )
+
+
+def _host_values(stats: dict[str, Any]) -> tuple:
+    """HOST_FIELDS values of a collect_host_stats() dict, in storage order."""
+    load = stats.get("load_avg") or [None, None, None]
+    disk = (stats.get("disk") or [{}])[0]
+    return (stats.get("cpu_temp"), stats.get("gpu_temp"),
+            load[0], load[1], load[2], stats.get("cpu_cores"),
+            disk.get("total"), disk.get("used"), disk.get("pct"))
 
 
-def store_container_stats(stats: list[dict[str, Any]]) -> None:
-    conn = get_conn()
-    rows = [(s["ts"], s["name"], json.dumps(s)) for s in stats]
-    conn.executemany("INSERT INTO container_stats (ts, name, data) VALUES (?, ?, ?)", rows)
-    conn.commit()
+def store_host_stats(conn: sqlite3.Connection, stats: dict[str, Any]) -> None:
+    conn.execute(
+        "INSERT OR IGNORE INTO host_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (stats["ts"], *_host_values(stats)),
+    )
 
 
-def store_host_stats(stats: dict[str, Any]) -> None:
-    conn = get_conn()
-    conn.execute("INSERT INTO host_stats (ts, data) VALUES (?, ?)",
-                 (stats["ts"], json.dumps(stats)))
-    conn.commit()
+def store_remote_host_stats(conn: sqlite3.Connection, host: str, stats: dict[str, Any]) -> None:
+    conn.execute(
+        f"INSERT OR IGNORE INTO remote_host_metrics (host, ts, {', '.join(HOST_FIELDS)}) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (host, stats["ts"], *_host_values(stats)),
+    )
 
 
-def store_alert(alert: dict[str, Any]) -> None:
-    conn = get_conn()
+def store_monitor_stats(conn: sqlite3.Connection, sample: dict[str, Any]) -> None:
+    conn.execute(
+        f"INSERT OR IGNORE INTO monitor_metrics (ts, {', '.join(MONITOR_FIELDS)}) "
+        f"VALUES (?{', ?' * len(MONITOR_FIELDS)})",
+        (sample["ts"], *(sample.get(f) for f in MONITOR_FIELDS)),
+    )
+
+
+def store_alert(conn: sqlite3.Connection, alert: dict[str, Any]) -> None:
     conn.execute("INSERT INTO alerts (ts, type, target, value, msg) VALUES (?, ?, ?, ?, ?)",
                  (alert["ts"], alert["type"], alert["target"], alert.get("value"), alert.get("msg")))
-    conn.commit()
 
 
-def get_container_history(name: str, hours: float = 1) -> list[dict[str, Any]]:
-    conn = get_conn()
-    cutoff = time.time() - hours * 3600
-    rows = conn.execute(
-        "SELECT data FROM container_stats WHERE name = ? AND ts > ? ORDER BY ts",
-        (name, cutoff),
-    ).fetchall()
-    return [json.loads(r["data"]) for r in rows]
+def store_state(conn: sqlite3.Connection, name: str, data: Any) -> None:
+    """Checkpoint a JSON-serializable piece of in-memory monitor state."""
+    conn.execute("INSERT OR REPLACE INTO monitor_state (name, ts, data) VALUES (?, ?, ?)",
+                 (name, time.time(), json.dumps(data, separators=(",", ":"))))
+
+
+def load_state(name: str) -> tuple[float, Any] | None:
+    """Last checkpoint of ``name`` as ``(ts, data)``, or None."""
+    with read_conn() as conn:
+        row = conn.execute("SELECT ts, data FROM monitor_state WHERE name = ?", (name,)).fetchone()
+    if row is None:
+        return None
+    return row["ts"], json.loads(row["data"])
+
+
+def _rollup_select(fields: tuple[str, ...] | list[str]) -> str:
+    """Rollup columns aliased to raw names, plus the bucket min/max."""
+    cols = []
+    for f in fields:
+        main = "last" if f in COUNTER_FIELDS else "avg"
+        cols += [f"{f}_{main} AS {f}", f"{f}_min", f"{f}_max"]
+    return ", ".join(cols)
+
+
+def _columns(cursor: sqlite3.Cursor, rows: list[sqlite3.Row]) -> dict[str, list]:
+    """Transpose result rows into ``{column: [values...]}``."""
+    return _transpose([d[0] for d in cursor.description], rows)
+
+
+def _transpose(names: list[str], rows: list) -> dict[str, list]:
+    if not rows:
+        return {n: [] for n in names}
+    return dict(zip(names, map(list, zip(*rows))))
+
+
+def _bucket_exprs(cols: list[str] | tuple[str, ...], rollup: bool, agg: str) -> str:
+    """Per-bucket aggregate of each column, reading raw or rollup columns.
+
+    Counters always keep their latest value. For p95 the per-sample values
+    are selected and the percentile is taken by ``_percentile_rows``.
+    """
+    exprs = []
+    for f in cols:
+        counter = f in COUNTER_FIELDS
+        if agg == "p95":
+            src = f"{f}_{'last' if counter else 'avg'}" if rollup else f
+            exprs.append(f"{src} AS {f}")
+        elif counter or agg == "max":
+            src = (f"{f}_last" if counter else f"{f}_max") if rollup else f
+            exprs.append(f"MAX({src}) AS {f}")
+        elif rollup:
+            # Bucket means weighted by their sample counts
+            exprs.append(f"SUM({f}_avg * n) / SUM(n) AS {f}")
+        else:
+            exprs.append(f"AVG({f}) AS {f}")
+    return ", ".join(exprs)
+
+
+def _bucketed(
+    conn: sqlite3.Connection,
+    source: str,
+    cols: list[str] | tuple[str, ...],
+    where: str,
+    params: dict[str, Any],
+    step: int,
+    agg: str,
+    rollup: bool = False,
+    per_container: bool = False,
+) -> tuple[list[str], Iterator[tuple]]:
+    """Aggregate ``source`` into ``step``-second buckets, one row per bucket.
+
+    avg and max are computed by SQLite's GROUP BY; p95 streams the rows
+    in bucket order through a single pass. With ``per_container`` the
+    source joins ``containers c`` and every row starts with the container
+    name, buckets ordered per container. Returns (column names, rows).
+    """
+    bucket = f"CAST(ts / {int(step)} AS INTEGER) * {int(step)}"
+    exprs = _bucket_exprs(cols, rollup, agg)
+    lead, key = ("c.name AS grp, ", "c.name, ") if per_container else ("", "")
+    if agg == "p95":
+        cur = conn.execute(f"SELECT {lead}{bucket} AS bucket, {exprs} FROM {source} WHERE {where} "
+                           f"ORDER BY {key}ts", params)
+        rows: Iterator[tuple] = _percentile_rows(cur, cols, 0.95, 2 if per_container else 1)
+    else:
+        rows = map(tuple, conn.execute(f"SELECT {lead}{bucket} AS bucket, {exprs} FROM {source} "
+                                       f"WHERE {where} GROUP BY {key}bucket ORDER BY {key}bucket", params))
+    return ["ts", *cols], rows
+
+
+def _percentile_rows(
+    rows: Iterator, cols: list[str] | tuple[str, ...], q: float, keys: int = 1,
+) -> Iterator[tuple]:
+    """Nearest-rank ``q`` percentile per column of rows grouped by their first ``keys`` values."""
+    counters = [f in COUNTER_FIELDS for f in cols]
+    for key, group in itertools.groupby(rows, key=lambda r: tuple(r[:keys])):
+        row = list(key)
+        for counter, values in zip(counters, zip(*(r[keys:] for r in group))):
+            vals = sorted(v for v in values if v is not None)
+            if not vals:
+                row.append(None)
+            elif counter:
+                row.append(vals[-1])
+            else:
+                row.append(vals[max(math.ceil(q * len(vals)) - 1, 0)])
+        yield tuple(row)
 
 
-def get_host_history(hours: float = 1) -> list[dict[str, Any]]:
-    conn = get_conn()
+def get_container_history(
+    name: str,
+    hours: float = 1,
+    fields: list[str] | None = None,
+    resolution: int = 0,
+    since: float | None = None,
+    columnar: bool = False,
+    step: int = 0,
+    agg: str = "avg",
+    prefix: str = "",
+) -> list[dict[str, Any]] | dict[str, list]:
+    """Samples for one container; ``fields`` limits which metric columns are read.
+
+    ``resolution`` selects a rollup tier in seconds (0 = raw samples),
+    ``since`` returns only samples newer than that ts, and ``columnar``
+    returns ``{column: [values...]}`` instead of one dict per sample.
+    With ``step``, the selected source is aggregated into ``step``-second
+    buckets with ``agg`` (one of HISTORY_AGGS), stamped with the bucket start.
+    ``prefix`` ("<host>/" for a federated agent) is prepended to ``name``
+    for the lookup only, so rows carry the name as given.
+    """
+    stored = prefix + name
+    cutoff = max(time.time() - hours * 3600, since or 0)
+    cols = [f for f in (fields or CONTAINER_FIELDS) if f in CONTAINER_FIELDS]
+    if step:
+        where = "container_id = (SELECT id FROM containers WHERE name = :name) AND ts > :cutoff"
+        table = "container_metrics"
+        if resolution:
+            where, table = "res = :res AND " + where, "container_rollup"
+        with read_conn() as conn:
+            names, rows = _bucketed(conn, table, cols, where,
+                                    {"name": stored, "cutoff": cutoff, "res": resolution},
+                                    step, agg, rollup=bool(resolution))
+            rows = list(rows)
+        if columnar:
+            return _transpose(names, rows)
+        return [{"name": name, **dict(zip(names, r))} for r in rows]
+    if resolution:
+        sql = (f"SELECT {', '.join(['ts', _rollup_select(cols)])} FROM container_rollup "
+               "WHERE res = ? AND container_id = (SELECT id FROM containers WHERE name = ?) "
+               "AND ts > ? ORDER BY ts")
+        params: tuple = (resolution, stored, cutoff)
+    else:
+        sql = (f"SELECT {', '.join(['ts', *cols])} FROM container_metrics "
+               "WHERE container_id = (SELECT id FROM containers WHERE name = ?) AND ts > ? ORDER BY ts")
+        params = (stored, cutoff)
+    with read_conn() as conn:
+        cur = conn.execute(sql, params)
+        rows = cur.fetchall()
+        if columnar:
+            return _columns(cur, rows)
+    return [{"name": name, **dict(r)} for r in rows]
+
+
+def _container_match(names: list[str] | None, prefix: str, params: dict[str, Any]) -> str:
+    """WHERE condition on ``containers c`` selecting ``names`` (None = all) under ``prefix``."""
+    if names is not None:
+        params["names"] = json.dumps([prefix + n for n in names])
+        return "c.name IN (SELECT value FROM json_each(:names))"
+    if prefix:
+        params.update(prefix=prefix, plen=len(prefix))
+        return "substr(c.name, 1, :plen) = :prefix"
+    return "instr(c.name, '/') = 0"
+
+
+def iter_container_histories(
+    names: list[str] | None,
+    prefix: str = "",
+    hours: float = 1,
+    fields: list[str] | None = None,
+    resolution: int = 0,
+    since: float | None = None,
+    step: int = 0,
+    agg: str = "avg",
+) -> Iterator[tuple[str, dict[str, list]]]:
+    """Columnar history of many containers from one range scan.
+
+    Yields ``(name, {column: [values...]})`` per container that has samples
+    in the window; other parameters are as for get_container_history.
+    ``names`` of None selects every container stored under ``prefix`` ("" for
+    local ones, "<host>/" for a federated agent's); the prefix is stripped
+    from the yielded names. Rows are read lazily, so iterate on one worker
+    thread and close the generator when done.
+    """
+    cutoff = max(time.time() - hours * 3600, since or 0)
+    cols = [f for f in (fields or CONTAINER_FIELDS) if f in CONTAINER_FIELDS]
+    params: dict[str, Any] = {"cutoff": cutoff, "res": resolution}
+    match = _container_match(names, prefix, params)
+    # CROSS JOIN keeps containers as the outer loop, walked in name order:
+    # one primary-key range per container and no sort of the result
+    table = "container_rollup" if resolution else "container_metrics"
+    source = f"containers c CROSS JOIN {table} m ON m.container_id = c.id"
+    if resolution:
+        source += " AND m.res = :res"
+    where = f"{match} AND m.ts > :cutoff"
+    with read_conn() as conn:
+        if step:
+            columns, rows = _bucketed(conn, source, cols, where, params, step, agg,
+                                      rollup=bool(resolution), per_container=True)
+        else:
+            select = _rollup_select(cols) if resolution else ", ".join(f"m.{f}" for f in cols)
+            cur = conn.execute(f"SELECT c.name, m.ts, {select} FROM {source} WHERE {where} "
+                               "ORDER BY c.name, m.ts", params)
+            columns, rows = [d[0] for d in cur.description[1:]], cur
+        for name, group in itertools.groupby(rows, key=lambda r: r[0]):
+            yield name[len(prefix):], _transpose(columns, [r[1:] for r in group])
+
+
+def iter_container_rows(
+    names: list[str] | None,
+    prefix: str = "",
+    start: float = 0,
+    end: float | None = None,
+    fields: list[str] | None = None,
+    batch: int = 1000,
+) -> Iterator[list[tuple]]:
+    """Raw samples of the selected containers with ``start < ts <= end``.
+
+    Yields batches of ``(name, ts, *fields)`` tuples, ordered by name then
+    ts, straight off the cursor, so memory does not grow with the range.
+    The header is ``["name", "ts", *fields]``; see
+    iter_container_histories for ``names``, ``prefix`` and threading.
+    """
+    cols = [f for f in (fields or CONTAINER_FIELDS) if f in CONTAINER_FIELDS]
+    params: dict[str, Any] = {"start": start, "end": end if end is not None else time.time()}
+    match = _container_match(names, prefix, params)
+    with read_conn() as conn:
+        select = ", ".join([f"substr(c.name, {len(prefix) + 1})", "m.ts", *(f"m.{f}" for f in cols)])
+        cur = conn.execute(
+            f"SELECT {select} "
+            "FROM containers c CROSS JOIN container_metrics m ON m.container_id = c.id "
+            f"WHERE {match} AND m.ts > :start AND m.ts <= :end ORDER BY c.name, m.ts", params)
+        while True:
+            rows = cur.fetchmany(batch)
+            if not rows:
+                return
+            yield [tuple(r) for r in rows]
+
+
+def _host_row(r: sqlite3.Row) -> dict[str, Any]:
+    """Rebuild the collect_host_stats() shape from a host_metrics row."""
+    disk = []
+    if r["disk_total"] is not None:
+        disk.append({
+            "mount": "/",
+            "total": r["disk_total"],
+            "used": r["disk_used"],
+            "free": r["disk_total"] - r["disk_used"],
+            "pct": r["disk_pct"],
+        })
+    out = {
+        "cpu_temp": r["cpu_temp"],
+        "gpu_temp": r["gpu_temp"],
+        "disk": disk,
+        "load_avg": [r["load_1"], r["load_5"], r["load_15"]],
+        "cpu_cores": r["cpu_cores"],
+        "ts": r["ts"],
+    }
+    # Rollup rows also carry per-bucket extremes
+    out.update({k: r[k] for k in r.keys() if k.endswith(("_min", "_max"))})
+    return out
+
+
+def get_host_history(
+    hours: float = 1,
+    resolution: int = 0,
+    since: float | None = None,
+    columnar: bool = False,
+    host: str | None = None,
+    step: int = 0,
+    agg: str = "avg",
+) -> list[dict[str, Any]] | dict[str, list]:
+    """Host samples; see get_container_history for the parameters.
+
+    ``host`` selects a federated agent's samples instead of the local ones;
+    those have no rollup tiers and are bucketed at query time instead.
+    The columnar form keeps the flat storage columns (load_1, disk_pct, ...).
+    """
+    cutoff = max(time.time() - hours * 3600, since or 0)
+    if step:
+        params = {"host": host, "cutoff": cutoff, "res": resolution}
+        if host:
+            table, where = "remote_host_metrics", "host = :host AND ts > :cutoff"
+        elif resolution:
+            table, where = "host_rollup", "res = :res AND ts > :cutoff"
+        else:
+            table, where = "host_metrics", "ts > :cutoff"
+        with read_conn() as conn:
+            names, rows = _bucketed(conn, table, HOST_FIELDS, where, params, step, agg,
+                                    rollup=table == "host_rollup")
+            rows = list(rows)
+        if columnar:
+            return _transpose(names, rows)
+        return [_host_row(dict(zip(names, r))) for r in rows]
+    if host and resolution:
+        aggs = ", ".join(f"AVG({f}) AS {f}, MIN({f}) AS {f}_min, MAX({f}) AS {f}_max"
+                         for f in HOST_FIELDS)
+        sql = (f"SELECT CAST(ts / :res AS INTEGER) * :res AS ts, {aggs} FROM remote_host_metrics "
+               "WHERE host = :host AND ts > :cutoff GROUP BY 1 ORDER BY 1")
+        params: Any = {"res": resolution, "host": host, "cutoff": cutoff}
+    elif host:
+        sql = (f"SELECT ts, {', '.join(HOST_FIELDS)} FROM remote_host_metrics "
+               "WHERE host = ? AND ts > ? ORDER BY ts")
+        params = (host, cutoff)
+    elif resolution:
+        sql = (f"SELECT ts, {_rollup_select(HOST_FIELDS)} FROM host_rollup "
+               "WHERE res = ? AND ts > ? ORDER BY ts")
+        params = (resolution, cutoff)
+    else:
+        sql = "SELECT * FROM host_metrics WHERE ts > ? ORDER BY ts"
+        params = (cutoff,)
+    with read_conn() as conn:
+        cur = conn.execute(sql, params)
+        rows = cur.fetchall()
+        if columnar:
+            return _columns(cur, rows)
+    return [_host_row(r) for r in rows]
+
+
+def get_monitor_history(hours: float = 1, resolution: int = 0) -> dict[str, list]:
+    """The monitor's own per-cycle samples, columnar.
+
+    There are no rollup tiers for these; with a ``resolution`` samples are
+    bucketed at query time, keeping the mean of each field plus the worst
+    cycle and the overrun count of the bucket.
+    """
     cutoff = time.time() - hours * 3600
-    rows = conn.execute(
-        "SELECT data FROM host_stats WHERE ts > ? ORDER BY ts",
-        (cutoff,),
-    ).fetchall()
-    return [json.loads(r["data"]) for r in rows]
+    if resolution:
+        aggs = ", ".join(f"SUM({f}) AS {f}" if f == "overrun" else f"AVG({f}) AS {f}"
+                         for f in MONITOR_FIELDS)
+        sql = (f"SELECT CAST(ts / :res AS INTEGER) * :res AS ts, {aggs}, MAX(cycle_ms) AS cycle_ms_max "
+               "FROM monitor_metrics WHERE ts > :cutoff GROUP BY 1 ORDER BY 1")
+        params: Any = {"res": resolution, "cutoff": cutoff}
+    else:
+        sql = f"SELECT ts, {', '.join(MONITOR_FIELDS)} FROM monitor_metrics WHERE ts > ? ORDER BY ts"
+        params = (cutoff,)
+    with read_conn() as conn:
+        cur = conn.execute(sql, params)
+        return _columns(cur, cur.fetchall())
 
 
 def get_alerts(hours: float = 24) -> list[dict[str, Any]]:
-    conn = get_conn()
     cutoff = time.time() - hours * 3600
-    rows = conn.execute(
-        "SELECT ts, type, target, value, msg FROM alerts WHERE ts > ? ORDER BY ts DESC",
-        (cutoff,),
-    ).fetchall()
+    with read_conn() as conn:
+        rows = conn.execute(
+            "SELECT ts, type, target, value, msg FROM alerts WHERE ts > ? ORDER BY ts DESC",
+            (cutoff,),
+        ).fetchall()
     return [dict(r) for r in rows]
-
-
-def cleanup_old_data() -> int:
-    """Delete data older than retention period. Returns deleted row count."""
-    conn = get_conn()
-    cutoff = time.time() - config.RETENTION_DAYS * 86400
-    c1 = conn.execute("DELETE FROM container_stats WHERE ts < ?", (cutoff,)).rowcount
-    c2 = conn.execute("DELETE FROM host_stats WHERE ts < ?", (cutoff,)).rowcount
-    c3 = conn.execute("DELETE FROM alerts WHERE ts < ?", (cutoff,)).rowcount
-    conn.commit()
-    return c1 + c2 + c3
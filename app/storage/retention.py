@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Any
+
+from app import config
+from app.storage.db import prune_container_names
+from app.storage.writer import StorageWriter
+
+logger = logging.getLogger(__name__)
+
+# Progress of the background retention task, reported by /api/internal/stats
+progress: dict[str, Any] = {
+    "running": False,
+    "last_started": 0.0,
+    "last_finished": 0.0,
+    "deleted_last_run": 0,
+    "deleted_total": 0,
+    "chunks_last_run": 0,
+    "containers_pruned": 0,
+    "free_pages": 0,
+}
+
+
+def _targets() -> list[tuple[str, str, str, tuple]]:
+    """(table, key columns, filter, params) for every expired row set."""
+    now = time.time()
+    cutoff = now - config.RETENTION_DAYS * 86400
+    targets = [
+        ("container_metrics", "container_id, ts", "ts < ?", (cutoff,)),
+        ("host_metrics", "ts", "ts < ?", (cutoff,)),
+        ("remote_host_metrics", "host, ts", "ts < ?", (cutoff,)),
+        ("monitor_metrics", "ts", "ts < ?", (cutoff,)),
+        ("alerts", "rowid", "ts < ?", (cutoff,)),
+    ]
+    for res, days in config.ROLLUP_TIERS.items():
+        tier_cutoff = now - days * 86400
+        targets.append(("container_rollup", "res, container_id, ts", "res = ? AND ts < ?", (res, tier_cutoff)))
+        targets.append(("host_rollup", "res, ts", "res = ? AND ts < ?", (res, tier_cutoff)))
+    return targets
+
+
+def delete_expired_chunk(conn: sqlite3.Connection, limit: int) -> int:
+    """Delete at most ``limit`` expired rows across all tables (writer job)."""
+    deleted = 0
+    for table, key, where, params in _targets():
+        if deleted >= limit:
+            break
+        deleted += conn.execute(
+            f"DELETE FROM {table} WHERE ({key}) IN "
+            f"(SELECT {key} FROM {table} WHERE {where} LIMIT ?)",
+            (*params, limit - deleted),
+        ).rowcount
+    return deleted
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int) -> int:
+    """Return up to ``pages`` free pages to the OS; returns pages still free (writer job)."""
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # sqlite3 steps a row-less statement once, which frees a single page;
+    # executescript() would step it through but COMMITs the writer's batch
+    for _ in range(min(int(pages), free)):
+        conn.execute("PRAGMA incremental_vacuum(1)")
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+async def run_retention(writer: StorageWriter) -> int:
+    """One full retention pass in bounded chunks. Returns deleted row count."""
+    chunk = config.RETENTION_CHUNK_ROWS
+    progress.update(running=True, last_started=time.time(), deleted_last_run=0, chunks_last_run=0)
+    deleted = 0
+    try:
+        while True:
+            n = await writer.call(delete_expired_chunk, chunk)
+            deleted += n
+            progress["deleted_last_run"] = deleted
+            progress["deleted_total"] += n
+            progress["chunks_last_run"] += 1
+            if n < chunk:
+                break
+            # Let collection writes and readers through between chunks
+            await asyncio.sleep(config.RETENTION_CHUNK_PAUSE)
+        progress["containers_pruned"] += await writer.call(prune_container_names)
+        while True:
+            free = await writer.call(incremental_vacuum, config.VACUUM_PAGES)
+            progress["free_pages"] = free
+            if free == 0:
+                break
+            await asyncio.sleep(config.RETENTION_CHUNK_PAUSE)
+    finally:
+        progress.update(running=False, last_finished=time.time())
+    if deleted:
+        logger.info("Retention removed %d expired rows in %d chunks",
+                    deleted, progress["chunks_last_run"])
+    return deleted
+
+
+async def retention_loop(writer: StorageWriter) -> None:
+    """Background task: run a retention pass every RETENTION_INTERVAL seconds."""
+    while True:
+        try:
+            await run_retention(writer)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Retention pass failed")
+        await asyncio.sleep(config.RETENTION_INTERVAL)
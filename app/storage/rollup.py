@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import logging
+import math
+import sqlite3
+import time
+
+from app import config
+from app.storage.db import CONTAINER_FIELDS, HOST_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Max source time range folded into one tier per pass, so a backfill after
+# migration or downtime is spread across several passes
+MAX_PASS_SECONDS = 6 * 3600
+
+
+def resolutions() -> list[int]:
+    """Rollup resolutions in seconds, finest first."""
+    return sorted(config.ROLLUP_TIERS)
+
+
+def pick_resolution(hours: float) -> int:
+    """Finest tier that keeps ``hours`` within HISTORY_MAX_POINTS (0 = raw)."""
+    window = hours * 3600
+    tiers = [(config.COLLECT_INTERVAL, config.RETENTION_DAYS, 0)]
+    tiers += [(res, config.ROLLUP_TIERS[res], res) for res in resolutions()]
+    for step, days, res in tiers:
+        if window / step <= config.HISTORY_MAX_POINTS and window <= days * 86400:
+            return res
+    return tiers[-1][2]
+
+
+def pick_source(hours: float, step: int, agg: str) -> int:
+    """Tier to aggregate into ``step``-second buckets over ``hours`` (0 = raw).
+
+    The coarsest tier no coarser than ``step`` that still covers the window,
+    so fewer rows are read for the same buckets. Short windows stay on raw
+    samples like pick_resolution does, since tiers lag behind by their
+    last open bucket; p95 needs the individual samples and uses raw data
+    whenever they are still kept.
+    """
+    window = hours * 3600
+    raw = window <= config.RETENTION_DAYS * 86400
+    if raw and (agg == "p95" or window / config.COLLECT_INTERVAL <= config.HISTORY_MAX_POINTS):
+        return 0
+    fits = [res for res in resolutions() if res <= step and window <= config.ROLLUP_TIERS[res] * 86400]
+    if fits:
+        return fits[-1]
+    return 0 if raw else pick_resolution(hours)
+
+
+def run_rollups(conn: sqlite3.Connection) -> int:
+    """Fold completed buckets into every tier. Returns written bucket count.
+
+    Runs as a storage writer job; the writer commits.
+    """
+    now = time.time()
+    written = 0
+    for kind, fields in (("container", CONTAINER_FIELDS), ("host", HOST_FIELDS)):
+        src_res = 0
+        # Leave the newest raw samples alone until any in-flight writes land
+        src_done = now - 2 * config.COLLECT_INTERVAL
+        for res in resolutions():
+            state_key = f"{kind}:{res}"
+            row = conn.execute(
+                "SELECT watermark FROM rollup_state WHERE name = ?", (state_key,),
+            ).fetchone()
+            lo = row[0] if row else _first_bucket(conn, kind, src_res, res)
+            if lo is None:
+                break
+            hi = min(math.floor(src_done / res) * res, lo + max(MAX_PASS_SECONDS, res))
+            if hi > lo:
+                conn.execute(
+                    _rollup_sql(kind, fields, src_res), {"res": res, "src": src_res, "lo": lo, "hi": hi},
+                )
+                # cursor.rowcount is -1 for INSERT statements with a WITH clause
+                written += conn.execute("SELECT changes()").fetchone()[0]
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollup_state (name, watermark) VALUES (?, ?)",
+                    (state_key, hi),
+                )
+                lo = hi
+            # Coarser tiers may only consume buckets this tier has completed
+            src_res, src_done = res, lo
+    if written:
+        logger.debug("Wrote %d rollup buckets", written)
+    return written
+
+
+def rewind_rollups(conn: sqlite3.Connection, kind: str, ts: float) -> None:
+    """Move ``kind``'s tier watermarks back to cover samples stored late at ``ts``.
+
+    Samples written below a watermark (e.g. a federated agent's delayed
+    push) would otherwise never be folded in; the affected buckets are
+    rebuilt from their source on the next pass. Runs as a writer job.
+    """
+    # Raw samples past retention are deleted anyway; rebuilding older
+    # buckets from a partly expired source would only lose data
+    ts = max(ts, time.time() - config.RETENTION_DAYS * 86400)
+    for res in resolutions():
+        conn.execute(
+            "UPDATE rollup_state SET watermark = MIN(watermark, ?) WHERE name = ?",
+            (math.floor(ts / res) * res, f"{kind}:{res}"),
+        )
+
+
+def _first_bucket(conn: sqlite3.Connection, kind: str, src_res: int, res: int) -> float | None:
+    if src_res:
+        row = conn.execute(
+            f"SELECT MIN(ts) FROM {kind}_rollup WHERE res = ?", (src_res,),
+        ).fetchone()
+    else:
+        row = conn.execute(f"SELECT MIN(ts) FROM {kind}_metrics").fetchone()
+    if row[0] is None:
+        return None
+    return math.floor(row[0] / res) * res
+
+
+def _rollup_sql(kind: str, fields: tuple[str, ...], src_res: int) -> str:
+    """INSERT ... SELECT folding one source tier (0 = raw) into :res buckets.
+
+    Aggregation happens in a CTE; the bucket's last value is picked up by
+    joining back to the source row at the bucket's max ts via its primary key.
+    """
+    key = ["container_id"] if kind == "container" else []
+    if src_res:
+        src = f"{kind}_rollup"
+        where = "res = :src AND "
+        aggs = ["SUM(n) AS n"]
+        for f in fields:
+            aggs += [
+                f"MIN({f}_min) AS {f}_min",
+                f"MAX({f}_max) AS {f}_max",
+                f"SUM({f}_avg * n) / SUM(CASE WHEN {f}_avg IS NOT NULL THEN n END) AS {f}_avg",
+            ]
+        last = [f"m.{f}_last" for f in fields]
+        join_res = "m.res = :src AND "
+    else:
+        src = f"{kind}_metrics"
+        where = ""
+        aggs = ["COUNT(*) AS n"]
+        for f in fields:
+            aggs += [f"MIN({f}) AS {f}_min", f"MAX({f}) AS {f}_max", f"AVG({f}) AS {f}_avg"]
+        last = [f"m.{f}" for f in fields]
+        join_res = ""
+
+    cols = ["res", *key, "ts", "n"]
+    values = [":res", *(f"a.{k}" for k in key), "a.b", "a.n"]
+    for f, last_col in zip(fields, last):
+        cols += [f"{f}_min", f"{f}_max", f"{f}_avg", f"{f}_last"]
+        values += [f"a.{f}_min", f"a.{f}_max", f"a.{f}_avg", last_col]
+    group = ", ".join([*key, "b"])
+    join = " AND ".join([*(f"m.{k} = a.{k}" for k in key), "m.ts = a.last_ts"])
+    select_key = "".join(f"{k}, " for k in key)
+    return f"""
+        WITH a AS (
+            SELECT {select_key}CAST(ts / :res AS INTEGER) * :res AS b,
+                   MAX(ts) AS last_ts, {', '.join(aggs)}
+            FROM {src}
+            WHERE {where}ts >= :lo AND ts < :hi
+            GROUP BY {group}
+        )
+        INSERT OR REPLACE INTO {kind}_rollup ({', '.join(cols)})
+        SELECT {', '.join(values)}
+        FROM a JOIN {src} m ON {join_res}{join}
+    """
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from app import config
+from app.instrumentation import Histogram
+from app.storage.db import connect
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on jobs folded into one transaction
+BATCH_MAX = 500
+
+# Back-off bounds (seconds) while ``call`` waits for room in a full queue
+CALL_RETRY_MIN = 0.05
+CALL_RETRY_MAX = 1.0
+
+WriteJob = Callable[..., Any]
+
+_STOP = object()
+
+
+class StorageWriter:
+    """Write-behind SQLite writer.
+
+    Jobs are ``fn(conn, *args)`` callables queued from the event loop and run
+    on a single thread that owns the write connection, one commit per batch.
+    ``submit`` never blocks: when the queue is full the job is dropped and
+    counted, so a slow disk cannot stall collection or the API.
+    """
+
+    def __init__(self, maxsize: int = 0, flush_interval: float = 0.0) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize or config.WRITE_QUEUE_SIZE)
+        self._flush_interval = flush_interval or config.WRITE_FLUSH_INTERVAL
+        self._thread: threading.Thread | None = None
+        self._conn: sqlite3.Connection | None = None
+        # Backpressure / throughput counters
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_commit_ms = 0.0
+        self.commit_ms = Histogram()
+        self.max_queued = 0
+
+    def start(self) -> None:
+        # Open (and migrate) on the caller's thread so schema errors surface at startup
+        self._conn = connect()
+        self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush everything queued so far, then close the connection."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, fn: WriteJob, *args: Any) -> bool:
+        try:
+            self._queue.put_nowait((fn, args))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning("Storage queue full, dropped %d writes so far", self.dropped)
+            return False
+        self.submitted += 1
+        self.max_queued = max(self.max_queued, self._queue.qsize())
+        return True
+
+    async def call(self, fn: WriteJob, *args: Any) -> Any:
+        """Queue a job and wait for its result (available after commit).
+
+        Unlike ``submit`` this waits for room in the queue, so use it only for
+        housekeeping jobs whose result the caller needs. The wait is an async
+        back-off, never a blocking put, so a full queue cannot stall the loop.
+        """
+        fut: Future = Future()
+        delay = CALL_RETRY_MIN
+        while True:
+            try:
+                self._queue.put_nowait((fn, args, fut))
+                break
+            except queue.Full:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CALL_RETRY_MAX)
+        self.submitted += 1
+        return await asyncio.wrap_future(fut)
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "max_queued": self.max_queued,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_commit_ms": round(self.last_commit_ms, 2),
+            "commit_ms": self.commit_ms.snapshot(),
+        }
+
+    def _run(self) -> None:
+        conn = self._conn
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Give the rest of this interval's writes a chance to join the batch
+            deadline = time.monotonic() + self._flush_interval
+            while len(batch) < BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        item = self._queue.get(timeout=remaining)
+                    else:
+                        item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            if _STOP in batch:
+                stopping = True
+                batch.remove(_STOP)
+                # Drain whatever was queued ahead of shutdown
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not _STOP:
+                        batch.append(item)
+            self._execute(conn, batch)
+        conn.close()
+        self._conn = None
+
+    def _execute(self, conn: sqlite3.Connection, batch: list[tuple]) -> None:
+        t0 = time.perf_counter()
+        results: list[tuple[Future, Any, BaseException | None]] = []
+        for fn, args, *fut in batch:
+            if fut and not fut[0].set_running_or_notify_cancel():
+                continue  # caller gave up (e.g. task cancelled at shutdown)
+            try:
+                result, error = fn(conn, *args), None
+            except Exception as e:
+                result, error = None, e
+                self.failed += 1
+                logger.exception("Storage write %s failed", getattr(fn, "__name__", fn))
+            if fut:
+                results.append((fut[0], result, error))
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            self.failed += len(batch)
+            logger.exception("Storage commit failed")
+            results = [(f, None, e) for f, _, _ in results]
+        for f, result, error in results:
+            if error is not None:
+                f.set_exception(error)
+            else:
+                f.set_result(result)
+        self.batches += 1
+        self.last_batch_size = len(batch)
+        self.last_commit_ms = (time.perf_counter() - t0) * 1000
+        self.commit_ms.observe(self.last_commit_ms)